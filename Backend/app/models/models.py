@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 
 # User Models
@@ -14,6 +14,10 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+class UserUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=2, max_length=100)
+    phone: Optional[str] = Field(None, min_length=10, max_length=15)
+
 class UserResponse(BaseModel):
     id: str
     name: str
@@ -28,7 +32,7 @@ class User(BaseModel):
     username: str
     email: str
     phone: str
-    password: str  # Plain text password as requested
+    password: Optional[str] = None  # Plain text password as requested; not loaded for authenticated requests
     purchase_history: List[str] = Field(default_factory=list)
     chat_history: List[Dict[str, Any]] = Field(default_factory=list)
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -80,11 +84,22 @@ class ProductResponse(BaseModel):
     in_stock: bool = True
     stock_quantity: int = 100
 
+class ProductBatchRequest(BaseModel):
+    product_ids: List[str] = Field(..., min_length=1, max_length=500)
+
 # Cart Models
 class CartItem(BaseModel):
     product_id: str
     quantity: int
 
+class CartOperation(BaseModel):
+    op: Literal["add", "set", "remove"]
+    product_id: str
+    quantity: int = 0
+
+class CartBatchRequest(BaseModel):
+    operations: List[CartOperation] = Field(..., min_length=1, max_length=100)
+
 class Cart(BaseModel):
     id: Optional[str] = None
     user_id: str
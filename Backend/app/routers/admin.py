@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, Query
+
+from app.services.database import get_database
+from app.routers.auth import require_admin
+from app.services.index_manager import index_manager
+from app.services.purchase_stats import purchase_stats
+from app.services.reorder_predictor import reorder_predictor
+
+# Every admin route requires an authenticated admin user
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/indexes", response_model=dict)
+async def get_index_report(db=Depends(get_database)):
+    """Declared vs existing indexes, plus undeclared and unused ones"""
+    if index_manager.last_report is None:
+        await index_manager.reconcile(db, build=False)
+    return {
+        "status": index_manager.status,
+        "report": index_manager.last_report
+    }
+
+@router.post("/indexes/reconcile", response_model=dict)
+async def reconcile_indexes(
+    build: bool = Query(True, description="Build missing indexes (false = report only)"),
+    db=Depends(get_database)
+):
+    """Diff declared indexes against MongoDB and build the missing ones"""
+    report = await index_manager.reconcile(db, build=build)
+    return {
+        "status": index_manager.status,
+        "report": report
+    }
+
+@router.post("/purchase-stats/rebuild", response_model=dict)
+async def rebuild_purchase_stats(
+    user_id: str = Query(None, description="Rebuild a single user's aggregates"),
+    db=Depends(get_database)
+):
+    """Recompute the per-user purchase aggregates from the purchases collection"""
+    count = await purchase_stats.rebuild(db, user_id=user_id)
+    return {"aggregates": count}
+
+@router.get("/reorder-predictions", response_model=dict)
+async def get_reorder_prediction_status():
+    """State and timings of the last reorder prediction run"""
+    return {
+        "status": reorder_predictor.status,
+        "last_run": reorder_predictor.last_run
+    }
+
+@router.post("/reorder-predictions/run", response_model=dict)
+async def run_reorder_predictions(db=Depends(get_database)):
+    """Recompute the stored reorder recommendations for every user now"""
+    last_run = await reorder_predictor.run(db)
+    return {
+        "status": reorder_predictor.status,
+        "last_run": last_run
+    }
@@ -5,8 +5,9 @@ from datetime import datetime, timedelta
 import os
 from typing import Optional
 
-from app.models.models import UserCreate, UserLogin, UserResponse, Token, User
+from app.models.models import UserCreate, UserLogin, UserUpdate, UserResponse, Token, User
 from app.services.database import get_database
+from app.services.user_cache import user_cache, IDENTITY_PROJECTION
 
 router = APIRouter()
 security = HTTPBearer()
@@ -15,6 +16,8 @@ security = HTTPBearer()
 SECRET_KEY = os.getenv("SECRET_KEY", "walmart_sparkathon_secret_key_2025")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Comma-separated emails allowed to call admin endpoints (empty = nobody)
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -45,7 +48,12 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         )
 
 async def get_current_user(email: str = Depends(verify_token), db=Depends(get_database)):
-    user = await db.users.find_one({"email": email})
+    cached_user = user_cache.get(email)
+    if cached_user is not None:
+        return cached_user
+    
+    # Load identity fields only - history arrays can be large
+    user = await db.users.find_one({"email": email}, IDENTITY_PROJECTION)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -56,7 +64,17 @@ async def get_current_user(email: str = Depends(verify_token), db=Depends(get_da
     user["id"] = str(user["_id"])
     del user["_id"]
     
-    return User(**user)
+    current_user = User(**user)
+    user_cache.put(email, current_user)
+    return current_user
+
+async def require_admin(current_user: User = Depends(get_current_user)):
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
 
 @router.post("/signup", response_model=dict)
 async def signup(user_data: UserCreate, db=Depends(get_database)):
@@ -89,6 +107,7 @@ async def signup(user_data: UserCreate, db=Depends(get_database)):
         "password": user_data.password,  # Storing as plain text as requested
         "purchase_history": [],
         "chat_history": [],
+        "order_count": 0,
         "created_at": datetime.utcnow()
     }
     
@@ -168,9 +187,10 @@ async def login(user_credentials: UserLogin, db=Depends(get_database)):
     }
 
 @router.post("/logout")
-async def logout(current_user: dict = Depends(get_current_user)):
+async def logout(current_user: User = Depends(get_current_user)):
     # In a real application, you might want to blacklist the token
-    # For simplicity, we'll just return a success message
+    # Drop the cached principal so the next request reloads it
+    user_cache.invalidate(current_user.email)
     return {"message": "Logout successful"}
 
 @router.get("/me", response_model=UserResponse)
@@ -183,3 +203,25 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
         phone=current_user.phone,
         created_at=current_user.created_at
     )
+
+@router.put("/me", response_model=UserResponse)
+async def update_current_user_info(
+    user_update: UserUpdate,
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_database)
+):
+    updates = user_update.model_dump(exclude_none=True)
+    if updates:
+        await db.users.update_one({"email": current_user.email}, {"$set": updates})
+        # Cached principal is stale now
+        user_cache.invalidate(current_user.email)
+    
+    updated_user = current_user.model_copy(update=updates)
+    return UserResponse(
+        id=updated_user.id,
+        name=updated_user.name,
+        username=updated_user.username,
+        email=updated_user.email,
+        phone=updated_user.phone,
+        created_at=updated_user.created_at
+    )
@@ -1,9 +1,17 @@
 from fastapi import APIRouter, HTTPException, Depends
+import time
+from typing import Optional
 from datetime import datetime, timedelta
-from bson import ObjectId
 
-from app.models.models import CartItem, CartResponse, User, ShippingAddress, PurchaseItem, OrderRequest
-from app.services.database import get_database
+from app.models.models import CartItem, CartBatchRequest, CartResponse, User, ShippingAddress, PurchaseItem, OrderRequest
+from app.services.database import get_database, run_in_transaction
+from app.services.product_cache import product_cache, product_id_candidates
+from app.services.cart_store import cart_store
+from app.services.cart_view import cart_view
+from app.services.inventory import inventory_manager, InsufficientStockError
+from app.services.order_history import order_history, SUMMARY_PROJECTION
+from app.services.purchase_stats import purchase_stats
+from app.services.pagination import clamp_limit, keyset_sort
 from app.routers.auth import get_current_user
 
 router = APIRouter()
@@ -15,21 +23,25 @@ async def get_cart(
 ):
     """Get user's cart"""
     
-    # Find all cart items for user
-    cursor = db.cart.find({"user_id": current_user.id})
-    cart_items = {}
-    total_items = 0
-    
-    async for item in cursor:
-        cart_items[item["product_id"]] = item["quantity"]
-        total_items += item["quantity"]
+    # One indexed fetch of the user's cart document
+    cart = await cart_store.get(db, current_user.id)
     
     return {
-        "items": cart_items,
-        "total_items": total_items,
-        "updated_at": datetime.utcnow()
+        "items": cart["items"],
+        "total_items": sum(cart["items"].values()),
+        "updated_at": cart["updated_at"]
     }
 
+@router.get("/cart/view", response_model=dict)
+async def get_cart_view(
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_database)
+):
+    """Get user's cart with product summaries, line totals, subtotal and stock warnings"""
+    
+    # Cached per user until the next cart mutation
+    return await cart_view.get(db, current_user.id)
+
 @router.post("/cart/add", response_model=dict)
 async def add_to_cart(
     cart_item: CartItem,
@@ -38,73 +50,17 @@ async def add_to_cart(
 ):
     """Add item to cart or update quantity"""
     
-    print(f"DEBUG: Trying to add product with ID: {cart_item.product_id}")
-    print(f"DEBUG: Product ID type: {type(cart_item.product_id)}")
-    print(f"DEBUG: Product ID length: {len(cart_item.product_id)}")
-    
     # Check if product exists
-    product = None
-    try:
-        # First try to find by the _id field (which contains the product_id from CSV)
-        product = await db.products.find_one({"_id": cart_item.product_id})
-        print(f"DEBUG: Found product by _id: {product is not None}")
-    except Exception as e:
-        print(f"DEBUG: Error searching by _id: {e}")
-        pass
-    
-    # If not found, try as ObjectId (in case it's a MongoDB ObjectId)
-    if not product:
-        try:
-            if len(cart_item.product_id) == 24:  # ObjectId length
-                product = await db.products.find_one({"_id": ObjectId(cart_item.product_id)})
-                print(f"DEBUG: Found product by ObjectId: {product is not None}")
-        except Exception as e:
-            print(f"DEBUG: Error searching by ObjectId: {e}")
-            pass
-    
-    # Let's also try to see what products exist in the database
-    if not product:
-        sample_products = await db.products.find().limit(3).to_list(3)
-        print(f"DEBUG: Sample products in database:")
-        for prod in sample_products:
-            print(f"  - _id: {prod.get('_id')}, type: {type(prod.get('_id'))}")
+    product = await product_cache.get(db, cart_item.product_id)
     
     if not product:
-        print(f"DEBUG: Product not found anywhere with ID: {cart_item.product_id}")
         raise HTTPException(status_code=404, detail=f"Product not found with ID: {cart_item.product_id}")
     
     # Use the actual _id from the found product for cart operations
     product_id_for_cart = str(product["_id"])
     
-    # Check if item already in cart
-    existing_item = await db.cart.find_one({
-        "user_id": current_user.id,
-        "product_id": product_id_for_cart
-    })
-    
-    if existing_item:
-        # Update quantity
-        new_quantity = existing_item["quantity"] + cart_item.quantity
-        await db.cart.update_one(
-            {
-                "user_id": current_user.id,
-                "product_id": product_id_for_cart
-            },
-            {
-                "$set": {
-                    "quantity": new_quantity,
-                    "added_at": datetime.utcnow()
-                }
-            }
-        )
-    else:
-        # Add new item
-        await db.cart.insert_one({
-            "user_id": current_user.id,
-            "product_id": product_id_for_cart,
-            "quantity": cart_item.quantity,
-            "added_at": datetime.utcnow()
-        })
+    # Atomic upsert + $inc, so concurrent adds of the same product cannot race
+    await cart_store.add(db, current_user.id, product_id_for_cart, cart_item.quantity)
     
     return {"message": "Item added to cart successfully"}
 
@@ -117,20 +73,7 @@ async def update_cart_item(
     """Update cart item quantity"""
     
     # Find the correct product_id format
-    product = None
-    try:
-        # First try to find by the _id field (which contains the product_id from CSV)
-        product = await db.products.find_one({"_id": cart_item.product_id})
-    except Exception:
-        pass
-    
-    # If not found, try as ObjectId (in case it's a MongoDB ObjectId)
-    if not product:
-        try:
-            if len(cart_item.product_id) == 24:  # ObjectId length
-                product = await db.products.find_one({"_id": ObjectId(cart_item.product_id)})
-        except Exception:
-            pass
+    product = await product_cache.get(db, cart_item.product_id)
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -139,31 +82,49 @@ async def update_cart_item(
     
     if cart_item.quantity <= 0:
         # Remove item if quantity is 0 or negative
-        await db.cart.delete_one({
-            "user_id": current_user.id,
-            "product_id": product_id_for_cart
-        })
+        await cart_store.remove(db, current_user.id, product_id_for_cart)
         return {"message": "Item removed from cart"}
     else:
         # Update quantity
-        result = await db.cart.update_one(
-            {
-                "user_id": current_user.id,
-                "product_id": product_id_for_cart
-            },
-            {
-                "$set": {
-                    "quantity": cart_item.quantity,
-                    "added_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        if result.matched_count == 0:
+        if not await cart_store.set_quantity(db, current_user.id, product_id_for_cart, cart_item.quantity):
             raise HTTPException(status_code=404, detail="Item not found in cart")
         
         return {"message": "Cart item updated successfully"}
 
+@router.post("/cart/batch", response_model=dict)
+async def batch_update_cart(
+    batch: CartBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_database)
+):
+    """Apply an ordered list of add/set/remove operations in one request"""
+    
+    # Resolve every product id with a single $in lookup
+    products = await product_cache.get_many(db, [operation.product_id for operation in batch.operations])
+    
+    missing = sorted({
+        operation.product_id for operation in batch.operations
+        if operation.op != "remove" and not products.get(operation.product_id)
+    })
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Products not found: {', '.join(missing)}")
+    
+    operations = []
+    for operation in batch.operations:
+        product = products.get(operation.product_id)
+        # Removals of unknown products still target the id as given
+        product_id_for_cart = str(product["_id"]) if product else operation.product_id
+        operations.append((operation.op, product_id_for_cart, operation.quantity))
+    
+    cart = await cart_store.apply(db, current_user.id, operations)
+    
+    return {
+        "items": cart["items"],
+        "total_items": sum(cart["items"].values()),
+        "updated_at": cart["updated_at"],
+        "operations_applied": len(operations)
+    }
+
 @router.delete("/cart/remove/{product_id}", response_model=dict)
 async def remove_from_cart(
     product_id: str,
@@ -173,20 +134,7 @@ async def remove_from_cart(
     """Remove item from cart"""
     
     # Find the correct product_id format
-    product = None
-    try:
-        # First try to find by the _id field (which contains the product_id from CSV)
-        product = await db.products.find_one({"_id": product_id})
-    except Exception:
-        pass
-    
-    # If not found, try as ObjectId (in case it's a MongoDB ObjectId)
-    if not product:
-        try:
-            if len(product_id) == 24:  # ObjectId length
-                product = await db.products.find_one({"_id": ObjectId(product_id)})
-        except Exception:
-            pass
+    product = await product_cache.get(db, product_id)
     
     if product:
         product_id_for_cart = str(product["_id"])
@@ -194,12 +142,7 @@ async def remove_from_cart(
         # If product not found, still try to remove by the provided ID
         product_id_for_cart = product_id
     
-    result = await db.cart.delete_one({
-        "user_id": current_user.id,
-        "product_id": product_id_for_cart
-    })
-    
-    if result.deleted_count == 0:
+    if not await cart_store.remove(db, current_user.id, product_id_for_cart):
         raise HTTPException(status_code=404, detail="Item not found in cart")
     
     return {"message": "Item removed from cart"}
@@ -211,10 +154,10 @@ async def clear_cart(
 ):
     """Clear entire cart"""
     
-    result = await db.cart.delete_many({"user_id": current_user.id})
+    removed = await cart_store.clear(db, current_user.id)
     
     return {
-        "message": f"Cart cleared. {result.deleted_count} items removed"
+        "message": f"Cart cleared. {removed} items removed"
     }
 
 @router.get("/cart/count", response_model=dict)
@@ -224,13 +167,7 @@ async def get_cart_count(
 ):
     """Get total number of items in cart"""
     
-    pipeline = [
-        {"$match": {"user_id": current_user.id}},
-        {"$group": {"_id": None, "total": {"$sum": "$quantity"}}}
-    ]
-    
-    result = await db.cart.aggregate(pipeline).to_list(1)
-    total_items = result[0]["total"] if result else 0
+    total_items = await cart_store.count(db, current_user.id)
     
     return {"total_items": total_items}
 
@@ -242,41 +179,50 @@ async def place_order_from_cart(
 ):
     """Place order from current cart items and save to purchase history"""
     
-    # Get all cart items for the user
-    cart_cursor = db.cart.find({"user_id": current_user.id})
-    cart_items = []
+    started = time.perf_counter()
+    timings = {}
     
-    async for item in cart_cursor:
-        cart_items.append(item)
+    def mark(stage, since):
+        now = time.perf_counter()
+        timings[stage] = round((now - since) * 1000, 2)
+        return now
     
-    if not cart_items:
+    # Get all cart items for the user
+    cart = await cart_store.get(db, current_user.id)
+    checkpoint = mark("cart_read_ms", started)
+    
+    if not cart["items"]:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
+    # Fetch every product in the cart with one $in query (fresh prices, not the product cache)
+    lookup_values = []
+    for product_id in cart["items"]:
+        lookup_values.extend(product_id_candidates(product_id))
+    products = {}
+    async for product in db.products.find({"_id": {"$in": lookup_values}, "deleted": {"$ne": True}}):
+        products[str(product["_id"])] = product
+    checkpoint = mark("product_lookup_ms", checkpoint)
+    
     # Calculate total amount and prepare purchase items
     total_amount = 0
     purchase_items = []
     
-    for cart_item in cart_items:
-        # Get product details to calculate price
-        product = await db.products.find_one({"_id": cart_item["product_id"]})
+    for product_id, quantity in cart["items"].items():
+        product = products.get(product_id)
         if not product:
-            # Try with ObjectId if string search fails
-            try:
-                product = await db.products.find_one({"_id": ObjectId(cart_item["product_id"])})
-            except:
-                continue
+            continue
+        
+        item_total = product["price"] * quantity
+        total_amount += item_total
         
-        if product:
-            item_total = product["price"] * cart_item["quantity"]
-            total_amount += item_total
-            
-            purchase_items.append({
-                "product_id": cart_item["product_id"],
-                "quantity": cart_item["quantity"],
-                "product_name": product.get("name", "Unknown Product"),
-                "unit_price": product["price"],
-                "total_price": item_total
-            })
+        purchase_items.append({
+            "product_id": product_id,
+            "quantity": quantity,
+            "product_name": product.get("name", "Unknown Product"),
+            "unit_price": product["price"],
+            "total_price": item_total
+        })
+    checkpoint = mark("pricing_ms", checkpoint)
     
     if not purchase_items:
         raise HTTPException(status_code=400, detail="No valid products found in cart")
@@ -294,18 +240,55 @@ async def place_order_from_cart(
         "created_at": datetime.utcnow()
     }
     
-    # Save to purchase history
-    result = await db.purchases.insert_one(purchase_doc)
+    # Hold stock before writing anything; fails instead of overselling
+    try:
+        reservation_id = await inventory_manager.reserve(
+            db, current_user.id, {item["product_id"]: item["quantity"] for item in purchase_items}
+        )
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    purchase_doc["reservation_id"] = reservation_id
+    checkpoint = mark("reservation_ms", checkpoint)
+    
+    async def write_order(session):
+        # The purchase is written, the stock committed and the cart cleared together, or none is
+        purchase = dict(purchase_doc)
+        result = await db.purchases.insert_one(purchase, session=session)
+        await order_history.record_order(db, current_user.id, session=session)
+        
+        problem = None
+        if not await inventory_manager.commit(db, reservation_id, session=session):
+            problem = "Stock reservation expired, please try again"
+        # Only clear the cart that was priced; a concurrent change aborts the checkout
+        elif await cart_store.clear(db, current_user.id, session=session, unchanged_since=cart["updated_at"]) is None:
+            problem = "Cart changed during checkout, please review it and try again"
+        
+        if problem:
+            if session is None:
+                # No transaction on a standalone server, so undo the writes by hand
+                await db.purchases.delete_one({"_id": result.inserted_id})
+                await order_history.record_order(db, current_user.id, increment=-1)
+                await inventory_manager.release(db, reservation_id, include_committed=True)
+            raise HTTPException(status_code=409, detail=problem)
+        
+        await purchase_stats.record(db, current_user.id, purchase_items, purchase["order_date"], session=session)
+        return result.inserted_id
     
-    # Clear the cart after successful order
-    await db.cart.delete_many({"user_id": current_user.id})
+    try:
+        order_id = await run_in_transaction(write_order)
+    except Exception:
+        await inventory_manager.release(db, reservation_id)
+        raise
+    checkpoint = mark("transaction_ms", checkpoint)
+    timings["total_ms"] = round((checkpoint - started) * 1000, 2)
     
     return {
         "message": "Order placed successfully",
-        "order_id": str(result.inserted_id),
+        "order_id": str(order_id),
         "total_amount": total_amount,
         "items_count": len(purchase_items),
-        "status": "confirmed"
+        "status": "confirmed",
+        "timings": timings
     }
 
 @router.get("/orders/history", response_model=dict)
@@ -313,34 +296,59 @@ async def get_order_history(
     current_user: User = Depends(get_current_user),
     db=Depends(get_database),
     skip: int = 0,
-    limit: int = 10
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    view: str = "full"
 ):
-    """Get user's order/purchase history"""
-    
-    cursor = db.purchases.find(
-        {"user_id": current_user.id}
-    ).sort("order_date", -1).skip(skip).limit(limit)
+    """Get user's order/purchase history.
+    
+    Pages are keyset-based: pass ``next_cursor`` from the previous response as
+    ``cursor``. ``skip`` is still accepted for older clients. ``view=summary``
+    leaves out item arrays and shipping addresses.
+    """
+    
+    if view not in ("full", "summary"):
+        raise HTTPException(status_code=400, detail="view must be 'full' or 'summary'")
+    summary = view == "summary"
+    limit = clamp_limit(max(limit, 1))
+    
+    next_cursor = None
+    if skip and not cursor:
+        # Legacy offset paging
+        projection = SUMMARY_PROJECTION if summary else None
+        purchases = await db.purchases.find(
+            {"user_id": current_user.id}, projection
+        ).sort(keyset_sort("order_date", -1)).skip(skip).limit(limit).to_list(limit)
+    else:
+        try:
+            purchases, next_cursor = await order_history.page(db, current_user.id, limit, cursor, summary=summary)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
     orders = []
-    async for purchase in cursor:
+    for purchase in purchases:
         order = {
             "order_id": str(purchase["_id"]),
-            "items": purchase["items"],
             "total_amount": purchase["total_amount"],
-            "shipping_address": purchase["shipping_address"],
             "payment_method": purchase["payment_method"],
             "status": purchase["status"],
             "order_date": purchase["order_date"],
             "estimated_delivery": purchase.get("estimated_delivery"),
         }
+        if summary:
+            order["items_count"] = purchase["items_count"]
+        else:
+            order["items"] = purchase["items"]
+            order["shipping_address"] = purchase["shipping_address"]
         orders.append(order)
     
-    # Get total count of orders
-    total_orders = await db.purchases.count_documents({"user_id": current_user.id})
+    # Maintained at checkout, so no count_documents per page
+    total_orders = await order_history.order_count(db, current_user.id)
     
     return {
         "orders": orders,
         "total_orders": total_orders,
         "page": skip // limit + 1,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     }
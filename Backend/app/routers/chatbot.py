@@ -1,20 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 from ..models.models import ChatMessage, ChatResponse, User
 from ..services.database import get_database
 from ..services.chatbot import chatbot_service
+from ..services.warmup import warmup
+from ..services.chat_store import chat_store
+from ..services.cart_store import cart_store
+from ..services.reorder_predictor import reorder_predictor
+from ..services.pagination import clamp_limit
 from .auth import get_current_user
 
 router = APIRouter(tags=["chatbot"])
 
+def ensure_chatbot_warm():
+    """Fail fast while the RAG system is still initializing in the background"""
+    if warmup.is_warming("chatbot"):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Chatbot is warming up, please retry shortly",
+            headers={"Retry-After": "10"}
+        )
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_bot(
     message: ChatMessage,
     current_user: User = Depends(get_current_user)
 ):
     """Send a message to the chatbot and get a response"""
+    ensure_chatbot_warm()
     db = await get_database()
     
     try:
@@ -29,6 +44,13 @@ async def chat_with_bot(
             message=message.message
         )
         
+        # Move the new turns into the chat message store and trim the user document;
+        # the reply is already generated, so a bookkeeping failure must not fail the request
+        try:
+            await chat_store.sync_embedded(db, str(current_user.id))
+        except Exception as e:
+            print(f"Warning: failed to sync chat history for user {current_user.id}: {e}")
+        
         return ChatResponse(
             message=bot_response,
             timestamp=datetime.utcnow()
@@ -43,21 +65,34 @@ async def chat_with_bot(
 
 @router.get("/history", response_model=List[dict])
 async def get_chat_history(
+    response: Response,
     current_user: User = Depends(get_current_user),
-    limit: int = 50
+    limit: int = 50,
+    before: Optional[str] = None
 ):
-    """Get user's chat history"""
+    """Get user's chat history, oldest first.
+    
+    Pages go backwards in time: pass the X-Next-Cursor header value as ``before``
+    to fetch older messages.
+    """
     db = await get_database()
     
     try:
-        chat_history = await chatbot_service.get_chat_history(db, str(current_user.id))
-        return chat_history[-limit:] if len(chat_history) > limit else chat_history
+        messages, older_cursor = await chat_store.get_history(
+            db, str(current_user.id), limit=clamp_limit(max(limit, 1)), cursor=before
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         print(f"Error getting chat history: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve chat history"
         )
+    
+    if older_cursor:
+        response.headers["X-Next-Cursor"] = older_cursor
+    return messages
 
 @router.delete("/history")
 async def clear_chat_history(current_user: User = Depends(get_current_user)):
@@ -65,8 +100,10 @@ async def clear_chat_history(current_user: User = Depends(get_current_user)):
     db = await get_database()
     
     try:
+        deleted = await chat_store.clear(db, str(current_user.id))
+        # Also drop the recent turns still embedded for conversation context
         success = await chatbot_service.clear_chat_history(db, str(current_user.id))
-        if success:
+        if success or deleted:
             return {"message": "Chat history cleared successfully"}
         else:
             return {"message": "No chat history to clear"}
@@ -101,84 +138,50 @@ async def reorder_products(current_user: User = Depends(get_current_user)):
     """Get reorder recommendations and add them to cart"""
     db = await get_database()
     
+    # Precomputed by the batch job: one indexed read
+    stored = await reorder_predictor.get(db, str(current_user.id))
+    if stored is None:
+        ensure_chatbot_warm()
+    
     try:
-        # Initialize RAG system if not already done
-        if not chatbot_service.products:
-            await chatbot_service.initialize_rag_system(db)
-        
-        # Get reorder recommendations
-        recommendations = await chatbot_service.get_reorder_recommendations(
-            db=db,
-            user_id=str(current_user.id)
-        )
+        if stored is not None:
+            recommendations = stored["items"]
+            source = {"source": "precomputed", "generated_at": stored["generated_at"]}
+        else:
+            # Initialize RAG system if not already done
+            if not chatbot_service.products:
+                await chatbot_service.initialize_rag_system(db)
+            
+            # No fresh batch results for this user yet, compute them on demand
+            recommendations = await chatbot_service.get_reorder_recommendations(
+                db=db,
+                user_id=str(current_user.id)
+            )
+            source = {"source": "live", "generated_at": datetime.utcnow()}
         
         if not recommendations:
             return {
                 "message": "No recommendations available",
                 "items_added": 0,
-                "recommendations": []
+                "recommendations": [],
+                **source
             }
         
-        # Add recommended products to cart
-        items_added = 0
-        cart_updates = []
-        
-        for rec in recommendations:
-            product_id = rec["product_id"]
-            quantity = rec["quantity"]
-            
-            try:
-                # Check if item already in cart
-                existing_item = await db.cart.find_one({
-                    "user_id": current_user.id,
-                    "product_id": product_id
-                })
-                
-                if existing_item:
-                    # Update quantity (add to existing)
-                    new_quantity = existing_item["quantity"] + quantity
-                    await db.cart.update_one(
-                        {
-                            "user_id": current_user.id,
-                            "product_id": product_id
-                        },
-                        {
-                            "$set": {
-                                "quantity": new_quantity,
-                                "added_at": datetime.utcnow()
-                            }
-                        }
-                    )
-                    cart_updates.append({
-                        "product_id": product_id,
-                        "action": "updated",
-                        "quantity": new_quantity
-                    })
-                else:
-                    # Add new item
-                    await db.cart.insert_one({
-                        "user_id": current_user.id,
-                        "product_id": product_id,
-                        "quantity": quantity,
-                        "added_at": datetime.utcnow()
-                    })
-                    cart_updates.append({
-                        "product_id": product_id,
-                        "action": "added",
-                        "quantity": quantity
-                    })
-                
-                items_added += 1
-                
-            except Exception as e:
-                print(f"Error adding product {product_id} to cart: {e}")
-                continue
+        # Add all recommended products in one bulk cart update
+        result = await cart_store.add_lines(db, current_user.id, recommendations)
+        items_added = result["items_added"]
+        cart_updates = [
+            {"product_id": line["product_id"], "action": line["status"], "quantity": line["quantity"]}
+            for line in result["lines"] if "quantity" in line
+        ]
         
         return {
             "message": f"Successfully added {items_added} recommended products to cart",
             "items_added": items_added,
             "cart_updates": cart_updates,
-            "recommendations": recommendations
+            "results": result["lines"],
+            "recommendations": recommendations,
+            **source
         }
         
     except Exception as e:
@@ -196,5 +199,6 @@ async def get_chatbot_status():
         "documents_loaded": len(chatbot_service.documents),
         "products_loaded": len(chatbot_service.products),
         "rag_enabled": chatbot_service.initialized,
-        "initialized": chatbot_service.initialized
+        "initialized": chatbot_service.initialized,
+        "warmup_state": warmup.state("chatbot")
     }
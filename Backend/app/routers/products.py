@@ -2,11 +2,26 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import Optional, List
 import re
 
-from app.models.models import ProductResponse
+from app.models.models import ProductResponse, ProductBatchRequest, User
 from app.services.database import get_database
+from app.services.search_engine import search_engine
+from app.services.product_cache import product_cache
+from app.services.facet_index import facet_index
+from app.services.taxonomy import category_filter
+from app.services.data_loader import data_loader
+from app.routers.auth import require_admin
+from app.services.pagination import (
+    DEFAULT_PAGE_SIZE, clamp_limit, decode_cursor, encode_cursor, keyset_sort, keyset_filter, split_page
+)
+from app.services.serializer import (
+    FastJSONResponse, STREAM_BATCH_SIZE, parse_fields, parse_stream_format, mongo_projection, project, stream_response
+)
 
 router = APIRouter()
 
+# Soft-deleted products (missing from the last catalog sync) are hidden from listings
+ACTIVE_PRODUCTS = {"deleted": {"$ne": True}}
+
 def map_product_to_response(product: dict) -> dict:
     """Map database product fields to API response format"""
     # Handle ingredients field - could be list, string, or None
@@ -39,6 +54,23 @@ def map_product_to_response(product: dict) -> dict:
         "stock_quantity": product.get("stock_quantity", 0)
     }
 
+def _facets_for(category, brand, min_price, max_price, search, scores=None):
+    """Facet counts for a listing request, or None while the facet index is building.
+
+    Search listings pass the hits' ``scores`` so the query is only scored once per request.
+    """
+    if not facet_index.ready:
+        return None
+    if search:
+        if scores is None:
+            return None
+        return facet_index.counts(
+            category, brand, min_price, max_price,
+            product_ids=scores,
+            cache_key=search.lower()
+        )
+    return facet_index.counts(category, brand, min_price, max_price)
+
 @router.get("/", response_model=dict)
 async def get_products(
     category: Optional[str] = Query(None, description="Filter by category"),
@@ -46,22 +78,32 @@ async def get_products(
     min_price: Optional[float] = Query(None, description="Minimum price filter"),
     max_price: Optional[float] = Query(None, description="Maximum price filter"),
     search: Optional[str] = Query(None, description="Search in product name and description"),
-    sort_by: Optional[str] = Query("name", description="Sort by: name, price, rating"),
+    sort_by: Optional[str] = Query(None, description="Sort by: name, price, rating, relevance (default: relevance when searching, else name)"),
     sort_order: Optional[str] = Query("asc", description="Sort order: asc, desc"),
-    page: int = Query(1, ge=1, description="Page number"),
-    limit: Optional[int] = Query(None, ge=1, description="Items per page (optional, no limit if not provided)"),
+    page: int = Query(1, ge=1, description="Page number (legacy offset pagination)"),
+    limit: Optional[int] = Query(None, ge=1, description="Items per page, capped at the server maximum (optional; no limit if not provided, except in cursor mode)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor (empty string for the first page)"),
+    fields: Optional[str] = Query(None, description="Comma-separated response fields to return (default: all)"),
+    format: Optional[str] = Query(None, description="Response format when no limit is given: json, ndjson, json-stream"),
     db=Depends(get_database)
 ):
     """Get products with filtering, sorting, and pagination"""
     
+    field_list = parse_fields(fields)
+    stream_format = parse_stream_format(format)
+    
+    if search and search_engine.ready and facet_index.ready:
+        # Rank, filter and page the hits in memory; only the page's ids are sent to Mongo
+        return await _ranked_listing(
+            search, category, brand, min_price, max_price, sort_by, sort_order, page, limit, cursor, field_list, stream_format, db
+        )
+    
     # Build filter query
-    filter_query = {}
+    filter_query = dict(ACTIVE_PRODUCTS)
     
     if category:
-        filter_query["$or"] = [
-            {"category": {"$regex": category, "$options": "i"}},
-            {"root_category_name": {"$regex": category, "$options": "i"}}
-        ]
+        # Exact match on the indexed taxonomy path also covers child categories
+        filter_query.update(category_filter(category))
     
     if brand:
         filter_query["brand"] = {"$regex": brand, "$options": "i"}
@@ -75,7 +117,7 @@ async def get_products(
         filter_query["price"] = price_filter
     
     if search:
-        # For search, we'll use a simpler approach and override category filter if both exist
+        # Indexes still building - fall back to a regex scan
         filter_query["$or"] = [
             {"name": {"$regex": search, "$options": "i"}},
             {"description": {"$regex": search, "$options": "i"}},
@@ -90,7 +132,44 @@ async def get_products(
         sort_field = "rating"
     
     sort_direction = 1 if sort_order == "asc" else -1
-    sort_query = [(sort_field, sort_direction)]
+    sort_query = keyset_sort(sort_field, sort_direction)
+    
+    if cursor is not None:
+        # Keyset mode: seek past the cursor on (sort_field, _id) instead of skipping
+        limit = clamp_limit(limit, DEFAULT_PAGE_SIZE)
+        try:
+            page_query = keyset_filter(filter_query, sort_field, sort_direction, cursor) if cursor else filter_query
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        projection = mongo_projection(field_list, sort_field)
+        documents = await db.products.find(page_query, projection).sort(sort_query).limit(limit + 1).to_list(limit + 1)
+        documents, next_cursor = split_page(documents, sort_field, limit)
+        
+        return FastJSONResponse({
+            "products": [project(map_product_to_response(product), field_list) for product in documents],
+            "pagination": {
+                "next_cursor": next_cursor,
+                "has_next": next_cursor is not None,
+                "limit": limit
+            },
+            "filters_applied": {
+                "category": category,
+                "brand": brand,
+                "min_price": min_price,
+                "max_price": max_price,
+                "search": search
+            },
+            "facets": _facets_for(category, brand, min_price, max_price, search)
+        })
+    
+    # Legacy offset mode: no limit still means the whole (filtered) listing
+    limit = clamp_limit(limit)
+    
+    if stream_format and not limit:
+        # Unbounded listing: stream rows from the cursor instead of buffering the catalog
+        db_cursor = db.products.find(filter_query, mongo_projection(field_list)).sort(sort_query).batch_size(STREAM_BATCH_SIZE)
+        return stream_response(db_cursor, lambda product: project(map_product_to_response(product), field_list), stream_format)
     
     # Calculate skip value for pagination
     skip = (page - 1) * (limit or 0) if limit else 0
@@ -99,17 +178,15 @@ async def get_products(
     total_count = await db.products.count_documents(filter_query)
     
     # Get products
+    projection = mongo_projection(field_list)
     if limit:
-        cursor = db.products.find(filter_query).sort(sort_query).skip(skip).limit(limit)
+        db_cursor = db.products.find(filter_query, projection).sort(sort_query).skip(skip).limit(limit)
     else:
         # No limit - return all products
-        cursor = db.products.find(filter_query).sort(sort_query)
-    
-    products = []
+        db_cursor = db.products.find(filter_query, projection).sort(sort_query)
     
-    async for product in cursor:
-        mapped_product = map_product_to_response(product)
-        products.append(ProductResponse(**mapped_product))
+    # Trusted DB documents: map to plain dicts instead of validating a ProductResponse per row
+    products = [project(map_product_to_response(product), field_list) async for product in db_cursor]
 
     # Calculate pagination info
     if limit:
@@ -122,7 +199,7 @@ async def get_products(
         has_next = False
         has_prev = False
 
-    return {
+    return FastJSONResponse({
         "products": products,
         "pagination": {
             "current_page": page,
@@ -138,24 +215,144 @@ async def get_products(
             "min_price": min_price,
             "max_price": max_price,
             "search": search
-        }
+        },
+        "facets": _facets_for(category, brand, min_price, max_price, search)
+    })
+
+async def _ranked_listing(
+    search: str,
+    category: Optional[str],
+    brand: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    sort_by: Optional[str],
+    sort_order: Optional[str],
+    page: int,
+    limit: Optional[int],
+    cursor: Optional[str],
+    field_list: Optional[List[str]],
+    stream_format: Optional[str],
+    db
+):
+    """Search listing for get_products: relevance order unless sort_by asks for a field"""
+    
+    # Score once; the same hits feed the filters, the page and the facet counts
+    scores = search_engine.score(search)
+    candidates = None
+    if category or brand or min_price is not None or max_price is not None:
+        candidates = facet_index.matching(scores, category, brand, min_price, max_price)
+    
+    # Explicit sorts order the hits by the facet rows' sort keys, with _id breaking ties
+    sort_field = None
+    if sort_by not in (None, "relevance"):
+        sort_field = sort_by if sort_by in ("price", "rating") else "name"
+    sort_direction = 1 if sort_order == "asc" else -1
+    
+    def hits_page(offset: int = 0, limit: Optional[int] = None, after=None):
+        """A page of (id, sort key) pairs and the total hit count"""
+        if sort_field is None:
+            return search_engine.search(search, offset=offset, limit=limit, candidates=candidates, scores=scores, after=after)
+        hits = candidates if candidates is not None else scores
+        return facet_index.sorted_page(hits, sort_field, sort_direction, offset=offset, limit=limit, after=after)
+    
+    projection = mongo_projection(field_list)
+    filters_applied = {
+        "category": category,
+        "brand": brand,
+        "min_price": min_price,
+        "max_price": max_price,
+        "search": search
     }
+    facets = _facets_for(category, brand, min_price, max_price, search, scores)
+    
+    if cursor is not None:
+        # Keyset mode over the hits: the cursor holds the (sort key, _id) of the last one
+        limit = clamp_limit(limit, DEFAULT_PAGE_SIZE)
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        ranked, _ = hits_page(limit=limit + 1, after=after)
+        next_cursor = None
+        if len(ranked) > limit:
+            ranked = ranked[:limit]
+            last_id, last_key = ranked[-1]
+            next_cursor = encode_cursor(last_key, last_id)
+        
+        documents = _ranked_documents(db, [doc_id for doc_id, _ in ranked], projection)
+        return FastJSONResponse({
+            "products": [project(map_product_to_response(product), field_list) async for product in documents],
+            "pagination": {
+                "next_cursor": next_cursor,
+                "has_next": next_cursor is not None,
+                "limit": limit
+            },
+            "filters_applied": filters_applied,
+            "facets": facets
+        })
+    
+    limit = clamp_limit(limit)
+    offset = (page - 1) * limit if limit else 0
+    ranked, total_count = hits_page(offset=offset, limit=limit)
+    documents = _ranked_documents(db, [doc_id for doc_id, _ in ranked], projection)
+    
+    if stream_format and not limit:
+        return stream_response(documents, lambda product: project(map_product_to_response(product), field_list), stream_format)
+    
+    products = [project(map_product_to_response(product), field_list) async for product in documents]
+    total_pages = (total_count + limit - 1) // limit if limit else 1
+    
+    return FastJSONResponse({
+        "products": products,
+        "pagination": {
+            "current_page": page,
+            "total_pages": total_pages,
+            "total_count": total_count,
+            "has_next": page < total_pages,
+            "has_prev": page > 1,
+            "limit": limit
+        },
+        "filters_applied": filters_applied,
+        "facets": facets
+    })
+
+@router.post("/batch", response_model=dict)
+async def get_products_batch(
+    batch: ProductBatchRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated response fields to return (default: all)"),
+    db=Depends(get_database)
+):
+    """Resolve many products in one request, returned in request order with explicit misses"""
+    
+    field_list = parse_fields(fields)
+    
+    # Normalize ids; duplicates are resolved once but still reported per position
+    product_ids = [product_id.strip() for product_id in batch.product_ids]
+    found = await product_cache.get_many(db, product_ids)
+    
+    results = []
+    missing = []
+    for product_id in product_ids:
+        product = found.get(product_id)
+        if product:
+            results.append({"requested_id": product_id, "product": project(map_product_to_response(product), field_list)})
+        else:
+            results.append({"requested_id": product_id, "product": None})
+            missing.append(product_id)
+    
+    return FastJSONResponse({
+        "results": results,
+        "missing": missing,
+        "count": len(results) - len(missing)
+    })
 
 @router.get("/{product_id}", response_model=dict)
 async def get_product_by_id(product_id: str, db=Depends(get_database)):
     """Get a specific product by ID"""
     
-    # Try to find by product_id field first, then by _id
-    product = await db.products.find_one({"_id": product_id})
-    
-    if not product:
-        # Try to find by _id if product_id doesn't work
-        try:
-            from bson import ObjectId
-            if ObjectId.is_valid(product_id):
-                product = await db.products.find_one({"_id": ObjectId(product_id)})
-        except:
-            pass
+    # Read through the product cache; a miss resolves string and ObjectId ids in one query
+    product = await product_cache.get(db, product_id)
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -170,13 +367,80 @@ async def get_product_by_id(product_id: str, db=Depends(get_database)):
 async def search_products(
     query: str,
     category: Optional[str] = Query(None, description="Filter by category"),
-    limit: Optional[int] = Query(None, ge=1, description="Items per page (optional, no limit if not provided)"),
+    page: int = Query(1, ge=1, description="Page number"),
+    limit: Optional[int] = Query(None, ge=1, description="Items per page, capped at the server maximum (optional, no limit if not provided)"),
+    fields: Optional[str] = Query(None, description="Comma-separated response fields to return (default: all)"),
+    format: Optional[str] = Query(None, description="Response format when no limit is given: json, ndjson, json-stream"),
     db=Depends(get_database)
 ):
-    """Search products using text search"""
+    """Search products, ranked by relevance"""
+    
+    field_list = parse_fields(fields)
+    stream_format = parse_stream_format(format)
+    
+    limit = clamp_limit(limit)
+    
+    # A category filter needs the facet rows; until they exist, scan like the index-less path
+    if not search_engine.ready or (category and not facet_index.ready):
+        return await _regex_search(query, category, limit, field_list, stream_format, db)
+    
+    scores = search_engine.score(query)
+    candidates = None
+    if category:
+        # Narrow the ranked hits down to the ones in the requested category
+        candidates = facet_index.matching(scores, category=category)
+    
+    offset = (page - 1) * limit if limit else 0
+    ranked, total_count = search_engine.search(query, offset=offset, limit=limit, candidates=candidates, scores=scores)
+    
+    # Fetch the page in bounded batches, in relevance order
+    documents = _ranked_documents(db, [doc_id for doc_id, _ in ranked], mongo_projection(field_list))
+    
+    if stream_format and not limit:
+        return stream_response(documents, lambda product: project(map_product_to_response(product), field_list), stream_format)
+    
+    products = [project(map_product_to_response(product), field_list) async for product in documents]
+    
+    total_pages = (total_count + limit - 1) // limit if limit else 1
+    
+    return FastJSONResponse({
+        "products": products,
+        "query": query,
+        "count": len(products),
+        "pagination": {
+            "current_page": page,
+            "total_pages": total_pages,
+            "total_count": total_count,
+            "has_next": page < total_pages,
+            "has_prev": page > 1,
+            "limit": limit
+        }
+    })
+
+async def _ranked_documents(db, ids: list, projection):
+    """Yield products in the given (relevance) order, fetching them in bounded batches"""
+    for start in range(0, len(ids), STREAM_BATCH_SIZE):
+        batch = ids[start:start + STREAM_BATCH_SIZE]
+        found = {}
+        async for product in db.products.find({"_id": {"$in": batch}}, projection):
+            found[product["_id"]] = product
+        for doc_id in batch:
+            if doc_id in found:
+                yield found[doc_id]
+
+async def _regex_search(
+    query: str,
+    category: Optional[str],
+    limit: Optional[int],
+    field_list: Optional[List[str]],
+    stream_format: Optional[str],
+    db
+):
+    """Fallback scan used while the search index is not built yet"""
     
     # Build search query
     search_query = {
+        **ACTIVE_PRODUCTS,
         "$or": [
             {"name": {"$regex": query, "$options": "i"}},
             {"description": {"$regex": query, "$options": "i"}},
@@ -186,34 +450,34 @@ async def search_products(
     }
     
     if category:
-        search_query["$or"] = [
-            {"category": {"$regex": category, "$options": "i"}},
-            {"root_category_name": {"$regex": category, "$options": "i"}}
-        ]
+        search_query.update(category_filter(category))
     
     # Get products
+    projection = mongo_projection(field_list)
     if limit:
-        cursor = db.products.find(search_query).limit(limit)
+        cursor = db.products.find(search_query, projection).limit(limit)
     else:
         # No limit - return all products
-        cursor = db.products.find(search_query)
+        cursor = db.products.find(search_query, projection)
     
-    products = []
+    if stream_format and not limit:
+        return stream_response(cursor.batch_size(STREAM_BATCH_SIZE), lambda product: project(map_product_to_response(product), field_list), stream_format)
     
-    async for product in cursor:
-        mapped_product = map_product_to_response(product)
-        products.append(ProductResponse(**mapped_product))
+    products = [project(map_product_to_response(product), field_list) async for product in cursor]
     
-    return {
+    return FastJSONResponse({
         "products": products,
         "query": query,
         "count": len(products)
-    }
+    })
 
 @router.get("/categories/list", response_model=dict)
 async def get_categories(db=Depends(get_database)):
     """Get all available categories"""
     
+    if facet_index.ready:
+        return facet_index.summary()
+    
     categories_from_category = await db.products.distinct("category")
     categories_from_root = await db.products.distinct("root_category_name")
     categories = list(set(categories_from_category + categories_from_root))
@@ -242,24 +506,47 @@ async def get_categories(db=Depends(get_database)):
         }
     }
 
+@router.get("/catalog/version", response_model=dict)
+async def get_catalog_version(db=Depends(get_database)):
+    """Current catalog version, bumped on every load or sync that changed products"""
+    return {"version": await data_loader.get_catalog_version(db)}
+
+@router.post("/catalog/sync", response_model=dict)
+async def sync_catalog(
+    soft_delete: bool = Query(False, description="Flag products missing from the feed as deleted"),
+    admin: User = Depends(require_admin),
+    db=Depends(get_database)
+):
+    """Delta-sync the catalog from the CSV feed (admin endpoint)"""
+    try:
+        return await data_loader.sync_products_from_csv(db, soft_delete=soft_delete)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"Catalog feed not found: {e.filename}")
+
+@router.get("/cache/stats", response_model=dict)
+async def get_product_cache_stats():
+    """Hit/miss counters for the product cache"""
+    return product_cache.stats()
+
 @router.get("/category/{category_name}", response_model=dict)
 async def get_products_by_category(
     category_name: str,
-    limit: Optional[int] = Query(None, ge=1, description="Items per page (optional, no limit if not provided)"),
-    page: int = Query(1, ge=1, description="Page number"),
+    limit: Optional[int] = Query(None, ge=1, description="Items per page, capped at the server maximum (optional; no limit if not provided, except in cursor mode)"),
+    page: int = Query(1, ge=1, description="Page number (legacy offset pagination)"),
     sort_by: Optional[str] = Query("name", description="Sort by: name, price, rating"),
     sort_order: Optional[str] = Query("asc", description="Sort order: asc, desc"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor (empty string for the first page)"),
+    fields: Optional[str] = Query(None, description="Comma-separated response fields to return (default: all)"),
+    format: Optional[str] = Query(None, description="Response format when no limit is given: json, ndjson, json-stream"),
     db=Depends(get_database)
 ):
     """Get products by category"""
     
+    field_list = parse_fields(fields)
+    stream_format = parse_stream_format(format)
+    
     # Build filter query
-    filter_query = {
-        "$or": [
-            {"category": {"$regex": category_name, "$options": "i"}},
-            {"root_category_name": {"$regex": category_name, "$options": "i"}}
-        ]
-    }
+    filter_query = {**ACTIVE_PRODUCTS, **category_filter(category_name)}
     
     # Build sort query
     sort_field = "name"
@@ -269,7 +556,37 @@ async def get_products_by_category(
         sort_field = "rating"
     
     sort_direction = 1 if sort_order == "asc" else -1
-    sort_query = [(sort_field, sort_direction)]
+    sort_query = keyset_sort(sort_field, sort_direction)
+    
+    if cursor is not None:
+        # Keyset mode: seek past the cursor on (sort_field, _id) instead of skipping
+        limit = clamp_limit(limit, DEFAULT_PAGE_SIZE)
+        try:
+            page_query = keyset_filter(filter_query, sort_field, sort_direction, cursor) if cursor else filter_query
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        projection = mongo_projection(field_list, sort_field)
+        documents = await db.products.find(page_query, projection).sort(sort_query).limit(limit + 1).to_list(limit + 1)
+        documents, next_cursor = split_page(documents, sort_field, limit)
+        
+        return FastJSONResponse({
+            "products": [project(map_product_to_response(product), field_list) for product in documents],
+            "category": category_name,
+            "pagination": {
+                "next_cursor": next_cursor,
+                "has_next": next_cursor is not None,
+                "limit": limit
+            }
+        })
+    
+    # Legacy offset mode: no limit still means the whole (filtered) listing
+    limit = clamp_limit(limit)
+    
+    if stream_format and not limit:
+        # Unbounded listing: stream rows from the cursor instead of buffering the catalog
+        db_cursor = db.products.find(filter_query, mongo_projection(field_list)).sort(sort_query).batch_size(STREAM_BATCH_SIZE)
+        return stream_response(db_cursor, lambda product: project(map_product_to_response(product), field_list), stream_format)
     
     # Calculate skip value for pagination
     skip = (page - 1) * (limit or 0) if limit else 0
@@ -278,17 +595,15 @@ async def get_products_by_category(
     total_count = await db.products.count_documents(filter_query)
     
     # Get products
+    projection = mongo_projection(field_list)
     if limit:
-        cursor = db.products.find(filter_query).sort(sort_query).skip(skip).limit(limit)
+        db_cursor = db.products.find(filter_query, projection).sort(sort_query).skip(skip).limit(limit)
     else:
         # No limit - return all products
-        cursor = db.products.find(filter_query).sort(sort_query)
-    
-    products = []
+        db_cursor = db.products.find(filter_query, projection).sort(sort_query)
     
-    async for product in cursor:
-        mapped_product = map_product_to_response(product)
-        products.append(ProductResponse(**mapped_product))
+    # Trusted DB documents: map to plain dicts instead of validating a ProductResponse per row
+    products = [project(map_product_to_response(product), field_list) async for product in db_cursor]
     
     # Calculate pagination info
     if limit:
@@ -297,7 +612,7 @@ async def get_products_by_category(
         # No pagination when no limit
         total_pages = 1
     
-    return {
+    return FastJSONResponse({
         "products": products,
         "category": category_name,
         "pagination": {
@@ -306,4 +621,4 @@ async def get_products_by_category(
             "total_count": total_count,
             "limit": limit
         }
-    }
+    })
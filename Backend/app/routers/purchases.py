@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 from ..models.models import Purchase, PurchaseCreate, User
-from ..services.database import get_database
+from ..services.database import get_database, run_in_transaction
+from ..services.cart_store import cart_store
+from ..services.inventory import inventory_manager, InsufficientStockError
+from ..services.order_history import order_history
+from ..services.purchase_stats import purchase_stats
+from ..services.pagination import clamp_limit, keyset_sort
 from .auth import get_current_user
 
 router = APIRouter(prefix="/purchases", tags=["purchases"])
@@ -40,11 +45,37 @@ async def place_order(
         "estimated_delivery": purchase_data.estimated_delivery or datetime.utcnow()
     }
     
-    # Insert purchase
-    result = await db.purchases.insert_one(purchase_doc)
+    # Hold stock for the order; fails instead of overselling
+    quantities = {}
+    for item in purchase_data.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    try:
+        reservation_id = await inventory_manager.reserve(db, str(current_user.id), quantities)
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    purchase_doc["reservation_id"] = reservation_id
+    
+    async def write_order(session):
+        # Insert purchase, commit the reserved stock and clear the cart together
+        result = await db.purchases.insert_one(purchase_doc, session=session)
+        await order_history.record_order(db, str(current_user.id), session=session)
+        if not await inventory_manager.commit(db, reservation_id, session=session):
+            if session is None:
+                await db.purchases.delete_one({"_id": result.inserted_id})
+                await order_history.record_order(db, str(current_user.id), increment=-1)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Stock reservation expired, please try again"
+            )
+        await cart_store.clear(db, str(current_user.id), session=session)
+        await purchase_stats.record(db, str(current_user.id), purchase_doc["items"], purchase_doc["order_date"], session=session)
+        return result
     
-    # Clear user's cart after successful order
-    await db.cart.delete_many({"user_id": str(current_user.id)})
+    try:
+        result = await run_in_transaction(write_order)
+    except Exception:
+        await inventory_manager.release(db, reservation_id)
+        raise
     
     # Get the created purchase
     created_purchase = await db.purchases.find_one({"_id": result.inserted_id})
@@ -55,25 +86,64 @@ async def place_order(
 
 @router.get("/", response_model=List[Purchase])
 async def get_purchase_history(
+    response: Response,
     current_user: User = Depends(get_current_user),
     skip: int = 0,
-    limit: int = 20
+    limit: int = 20,
+    cursor: Optional[str] = None
 ):
-    """Get user's purchase history"""
-    db = await get_database()
+    """Get user's purchase history, newest first.
     
-    cursor = db.purchases.find(
-        {"user_id": str(current_user.id)}
-    ).sort("order_date", -1).skip(skip).limit(limit)
+    Pass the X-Next-Cursor header value as ``cursor`` to fetch the next page;
+    ``skip`` is still accepted for older clients. X-Total-Count carries the
+    user's order count.
+    """
+    db = await get_database()
+    user_id = str(current_user.id)
+    limit = clamp_limit(max(limit, 1))
+    
+    if skip and not cursor:
+        documents = await db.purchases.find(
+            {"user_id": user_id}
+        ).sort(keyset_sort("order_date", -1)).skip(skip).limit(limit).to_list(limit)
+    else:
+        try:
+            documents, next_cursor = await order_history.page(db, user_id, limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["X-Total-Count"] = str(await order_history.order_count(db, user_id))
     
     purchases = []
-    async for purchase in cursor:
+    for purchase in documents:
         purchase["id"] = str(purchase["_id"])
         del purchase["_id"]
         purchases.append(Purchase(**purchase))
     
     return purchases
 
+@router.get("/stats", response_model=dict)
+async def get_purchase_stats(
+    current_user: User = Depends(get_current_user),
+    limit: int = 20,
+    sort_by: str = "purchase_count",
+    product_id: Optional[str] = None
+):
+    """Per-product purchase aggregates for the user: count, quantity, last purchase, mean repurchase interval"""
+    db = await get_database()
+    user_id = str(current_user.id)
+    
+    if product_id:
+        stat = await purchase_stats.get(db, user_id, product_id)
+        return {"products": [stat] if stat else []}
+    
+    try:
+        stats = await purchase_stats.for_user(db, user_id, limit=clamp_limit(max(limit, 1)), sort_by=sort_by)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"products": stats}
+
 @router.get("/{purchase_id}", response_model=Purchase)
 async def get_purchase_details(
     purchase_id: str,
@@ -168,33 +238,12 @@ async def reorder_purchase(
             detail="Purchase not found"
         )
     
-    # Add items to cart
-    for item in original_purchase["items"]:
-        # Check if product still exists
-        product = await db.products.find_one({"_id": ObjectId(item["product_id"])})
-        if product:
-            # Check if item already in cart
-            existing_cart_item = await db.cart.find_one({
-                "user_id": str(current_user.id),
-                "product_id": item["product_id"]
-            })
-            
-            if existing_cart_item:
-                # Update quantity
-                await db.cart.update_one(
-                    {
-                        "user_id": str(current_user.id),
-                        "product_id": item["product_id"]
-                    },
-                    {"$inc": {"quantity": item["quantity"]}}
-                )
-            else:
-                # Add new cart item
-                await db.cart.insert_one({
-                    "user_id": str(current_user.id),
-                    "product_id": item["product_id"],
-                    "quantity": item["quantity"],
-                    "added_at": datetime.utcnow()
-                })
-    
-    return {"message": "Items added to cart successfully"}
+    # Add every item in one bulk cart update; products that no longer exist are reported per line
+    result = await cart_store.add_lines(db, str(current_user.id), original_purchase["items"])
+    
+    return {
+        "message": f"{result['items_added']} of {len(result['lines'])} items added to cart",
+        "items_added": result["items_added"],
+        "results": result["lines"],
+        "cart": result["cart"]["items"]
+    }
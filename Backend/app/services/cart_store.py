@@ -0,0 +1,275 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import ReturnDocument, UpdateOne
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.services.product_cache import product_cache
+
+MIGRATION_BATCH_SIZE = 500
+
+# Per-line outcomes reported by add_lines
+LINE_ADDED = "added"
+LINE_UPDATED = "updated"
+LINE_NOT_FOUND = "not_found"
+LINE_INVALID_QUANTITY = "invalid_quantity"
+
+
+def encode_key(product_id: str) -> str:
+    """Make a product id safe to use as a field name in the items map"""
+    return product_id.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def decode_key(key: str) -> str:
+    return key.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+
+class CartStore:
+    """One cart document per user in ``carts``, holding an ``items`` map of product_id -> quantity.
+
+    Every mutation is a single atomic update, so concurrent adds cannot race.
+    """
+
+    def _field(self, product_id: str) -> str:
+        return f"items.{encode_key(product_id)}"
+
+    def _items(self, cart: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        if not cart:
+            return {}
+        return {decode_key(key): quantity for key, quantity in (cart.get("items") or {}).items()}
+
+    async def get(self, db: AsyncIOMotorDatabase, user_id: str) -> Dict[str, Any]:
+        """Cart items and timestamp in one indexed fetch"""
+        cart = await db.carts.find_one({"user_id": user_id}, {"items": 1, "updated_at": 1})
+        return {
+            "items": self._items(cart),
+            "updated_at": (cart or {}).get("updated_at") or datetime.utcnow()
+        }
+
+    async def add(self, db: AsyncIOMotorDatabase, user_id: str, product_id: str, quantity: int) -> int:
+        """Add quantity to a line (creating the cart and line as needed); returns the new quantity"""
+        cart = await db.carts.find_one_and_update(
+            {"user_id": user_id},
+            {
+                "$inc": {self._field(product_id): quantity},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            projection={self._field(product_id): 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return self._items(cart).get(product_id, quantity)
+
+    def add_operation(self, user_id: str, product_id: str, quantity: int) -> UpdateOne:
+        """The same upsert as ``add``, for use in a bulk_write"""
+        return UpdateOne(
+            {"user_id": user_id},
+            {
+                "$inc": {self._field(product_id): quantity},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+
+    def set_operation(self, user_id: str, product_id: str, quantity: int) -> UpdateOne:
+        """Set a line's quantity (creating it if needed); 0 or less removes it"""
+        if quantity <= 0:
+            return self.remove_operation(user_id, product_id)
+        return UpdateOne(
+            {"user_id": user_id},
+            {"$set": {self._field(product_id): quantity, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    def remove_operation(self, user_id: str, product_id: str) -> UpdateOne:
+        return UpdateOne(
+            {"user_id": user_id},
+            {"$unset": {self._field(product_id): ""}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    async def apply(self, db: AsyncIOMotorDatabase, user_id: str, operations: List[Tuple[str, str, int]]) -> Dict[str, Any]:
+        """Apply (op, product_id, quantity) operations in order with one bulk_write.
+
+        ``op`` is "add", "set" or "remove". Returns the resulting cart.
+        """
+        builders = {
+            "add": lambda product_id, quantity: self.add_operation(user_id, product_id, quantity),
+            "set": lambda product_id, quantity: self.set_operation(user_id, product_id, quantity),
+            "remove": lambda product_id, quantity: self.remove_operation(user_id, product_id)
+        }
+        requests = []
+        for op, product_id, quantity in operations:
+            if op not in builders:
+                raise ValueError(f"Unknown cart operation: {op}")
+            requests.append(builders[op](product_id, quantity))
+
+        if any(op == "add" for op, _, _ in operations):
+            # Negative adds can take a line to zero; drop those lines like set/update do.
+            # Filtering server-side keeps a line a concurrent add just topped up again.
+            requests.append(UpdateOne(
+                {"user_id": user_id},
+                [{"$set": {
+                    "items": {"$arrayToObject": {"$filter": {
+                        "input": {"$objectToArray": {"$ifNull": ["$items", {}]}},
+                        "cond": {"$gt": ["$$this.v", 0]}
+                    }}},
+                    "updated_at": datetime.utcnow()
+                }}]
+            ))
+
+        if requests:
+            await db.carts.bulk_write(requests, ordered=True)
+        return await self.get(db, user_id)
+
+    async def add_lines(self, db: AsyncIOMotorDatabase, user_id: str, lines: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Add many {product_id, quantity} lines to the cart in one go.
+
+        Products are resolved with at most one $in query and every add is
+        applied in a single bulk_write. Returns the resulting cart and one
+        outcome per requested line, in request order. Soft-deleted products
+        resolve as missing in the product cache, so they report ``not_found``.
+        """
+        products = await product_cache.get_many(db, [str(line["product_id"]) for line in lines])
+
+        outcomes: List[Dict[str, Any]] = []
+        added: Dict[str, int] = {}
+        for line in lines:
+            requested_id = str(line["product_id"])
+            quantity = line.get("quantity", 0)
+            product = products.get(requested_id)
+            outcome = {"product_id": requested_id, "requested_quantity": quantity}
+
+            if isinstance(quantity, bool) or not isinstance(quantity, (int, float)) or quantity < 1:
+                outcome["status"] = LINE_INVALID_QUANTITY
+            elif not product:
+                outcome["status"] = LINE_NOT_FOUND
+            else:
+                # Cart keys use the product's actual _id, like the single-item routes
+                outcome["product_id"] = str(product["_id"])
+                added[outcome["product_id"]] = added.get(outcome["product_id"], 0) + int(quantity)
+            outcomes.append(outcome)
+
+        if added:
+            cart = await self.apply(db, user_id, [("add", product_id, quantity) for product_id, quantity in added.items()])
+        else:
+            cart = await self.get(db, user_id)
+
+        for outcome in outcomes:
+            if "status" in outcome:
+                continue
+            quantity = cart["items"].get(outcome["product_id"], 0)
+            # A line whose quantity is exactly what was added did not exist before
+            outcome["status"] = LINE_ADDED if quantity == added[outcome["product_id"]] else LINE_UPDATED
+            outcome["quantity"] = quantity
+
+        return {
+            "cart": cart,
+            "lines": outcomes,
+            "items_added": sum(1 for outcome in outcomes if outcome["status"] in (LINE_ADDED, LINE_UPDATED))
+        }
+
+    async def set_quantity(self, db: AsyncIOMotorDatabase, user_id: str, product_id: str, quantity: int) -> bool:
+        """Set a line's quantity; a quantity of 0 or less removes it.
+
+        Returns False when the product is not in the cart.
+        """
+        if quantity <= 0:
+            return await self.remove(db, user_id, product_id)
+
+        result = await db.carts.update_one(
+            {"user_id": user_id, self._field(product_id): {"$exists": True}},
+            {"$set": {self._field(product_id): quantity, "updated_at": datetime.utcnow()}}
+        )
+        return result.matched_count > 0
+
+    async def remove(self, db: AsyncIOMotorDatabase, user_id: str, product_id: str) -> bool:
+        """Remove a line; returns False when it was not in the cart"""
+        result = await db.carts.update_one(
+            {"user_id": user_id, self._field(product_id): {"$exists": True}},
+            {"$unset": {self._field(product_id): ""}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+        return result.modified_count > 0
+
+    async def clear(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        session=None,
+        unchanged_since: Optional[datetime] = None
+    ) -> Optional[int]:
+        """Empty the cart; returns the number of lines removed.
+
+        With ``unchanged_since`` the cart is only cleared if it was not modified
+        after that updated_at, and None is returned when it was.
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        if unchanged_since is not None:
+            query["updated_at"] = unchanged_since
+        previous = await db.carts.find_one_and_update(
+            query,
+            {"$set": {"items": {}, "updated_at": datetime.utcnow()}},
+            projection={"items": 1},
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+        if previous is None and unchanged_since is not None:
+            return None
+        return len(self._items(previous))
+
+    async def count(self, db: AsyncIOMotorDatabase, user_id: str) -> int:
+        cart = await self.get(db, user_id)
+        return sum(cart["items"].values())
+
+    async def migrate_line_documents(self, db: AsyncIOMotorDatabase) -> Dict[str, int]:
+        """Fold legacy one-document-per-line ``cart`` entries into the per-user ``carts`` documents.
+
+        Each line's $inc only applies if the cart does not list the line in
+        ``migrated_lines`` yet, and records it there in the same update. Lines
+        are deleted afterwards, so a run interrupted between the two steps (or
+        racing another worker's run) can be repeated without adding any
+        quantity twice. The markers are kept: they are bounded by the legacy
+        lines and never read by the cart routes.
+        """
+        stats = {"lines": 0, "users": 0}
+        users = set()
+        cursor = db.cart.find({}).batch_size(MIGRATION_BATCH_SIZE)
+
+        lines = []
+        async for line in cursor:
+            lines.append(line)
+            users.add(line["user_id"])
+            if len(lines) >= MIGRATION_BATCH_SIZE:
+                await self._apply_migration_batch(db, lines)
+                stats["lines"] += len(lines)
+                lines = []
+
+        if lines:
+            await self._apply_migration_batch(db, lines)
+            stats["lines"] += len(lines)
+
+        stats["users"] = len(users)
+        if stats["lines"]:
+            print(f"Migrated {stats['lines']} cart lines for {stats['users']} users")
+        return stats
+
+    async def _apply_migration_batch(self, db: AsyncIOMotorDatabase, lines: List[Dict[str, Any]]):
+        now = datetime.utcnow()
+        # Create missing carts first: the guarded updates below cannot upsert
+        operations = [
+            UpdateOne({"user_id": user_id}, {"$setOnInsert": {"items": {}, "updated_at": now}}, upsert=True)
+            for user_id in {line["user_id"] for line in lines}
+        ]
+        for line in lines:
+            operations.append(UpdateOne(
+                {"user_id": line["user_id"], "migrated_lines": {"$ne": line["_id"]}},
+                {
+                    "$inc": {self._field(str(line["product_id"])): line.get("quantity", 0)},
+                    "$set": {"updated_at": now},
+                    "$addToSet": {"migrated_lines": line["_id"]}
+                }
+            ))
+        await db.carts.bulk_write(operations, ordered=True)
+        await db.cart.delete_many({"_id": {"$in": [line["_id"] for line in lines]}})
+
+# Instantiate global cart store
+cart_store = CartStore()
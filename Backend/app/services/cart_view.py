@@ -0,0 +1,121 @@
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.services.cart_store import cart_store
+from app.services.product_cache import product_cache
+
+# Hydrated carts kept per user; an entry is only reused while the cart's updated_at is unchanged
+CART_VIEW_CACHE_SIZE = int(os.getenv("CART_VIEW_CACHE_SIZE", "2000"))
+# Upper bound on how stale product prices and stock in a cached view may get
+CART_VIEW_TTL = float(os.getenv("CART_VIEW_TTL", "60"))
+
+# Warning codes attached to cart lines
+UNAVAILABLE = "unavailable"
+OUT_OF_STOCK = "out_of_stock"
+INSUFFICIENT_STOCK = "insufficient_stock"
+
+
+def product_summary(product: Dict[str, Any]) -> Dict[str, Any]:
+    """The product fields the cart page renders"""
+    image_urls = product.get("image_urls") or []
+    return {
+        "id": str(product["_id"]),
+        "name": product.get("name", "Unknown Product"),
+        "brand": product.get("brand"),
+        "price": product.get("price", 0.0),
+        "currency": product.get("currency", "USD"),
+        # Same field mapping as the product routes' responses
+        "image_url": product.get("main_image") or (image_urls[0] if image_urls else ""),
+        "in_stock": (product.get("stock_quantity") or 0) > 0,
+        "stock_quantity": product.get("stock_quantity", 0)
+    }
+
+
+def line_warnings(product: Optional[Dict[str, Any]], quantity: int) -> list:
+    if not product or product.get("deleted"):
+        return [UNAVAILABLE]
+    # Products have no in_stock field; it is derived from stock_quantity
+    stock = product.get("stock_quantity") or 0
+    if stock <= 0:
+        return [OUT_OF_STOCK]
+    if quantity > stock:
+        return [INSUFFICIENT_STOCK]
+    return []
+
+
+class CartView:
+    """Server-side hydrated cart: product summaries, line totals, cart total and stock warnings.
+
+    The cart document's updated_at changes on every mutation, so a cached view
+    is valid exactly until the next cart write, in any worker.
+    """
+
+    def __init__(self, max_size: int = CART_VIEW_CACHE_SIZE, ttl: float = CART_VIEW_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # user_id -> (expires_at, cart updated_at, view)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, db: AsyncIOMotorDatabase, user_id: str) -> Dict[str, Any]:
+        cart = await cart_store.get(db, user_id)
+
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            expires_at, updated_at, view = entry
+            if updated_at == cart["updated_at"] and expires_at >= time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return view
+
+        self.misses += 1
+        view = await self.hydrate(db, cart)
+        self._entries[user_id] = (time.monotonic() + self.ttl, cart["updated_at"], view)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return view
+
+    async def hydrate(self, db: AsyncIOMotorDatabase, cart: Dict[str, Any]) -> Dict[str, Any]:
+        """Join product summaries onto cart lines with at most one product query"""
+        products = await product_cache.get_many(db, cart["items"].keys())
+
+        lines = []
+        subtotal = 0.0
+        total_items = 0
+        warnings = 0
+        for product_id, quantity in cart["items"].items():
+            product = products.get(product_id)
+            line_issues = line_warnings(product, quantity)
+            line = {
+                "product_id": product_id,
+                "quantity": quantity,
+                "product": product_summary(product) if product else None,
+                "line_total": None,
+                "warnings": line_issues
+            }
+            if product and UNAVAILABLE not in line_issues:
+                line["line_total"] = round(product.get("price", 0.0) * quantity, 2)
+                subtotal += line["line_total"]
+            total_items += quantity
+            warnings += bool(line_issues)
+            lines.append(line)
+
+        return {
+            "items": cart["items"],
+            "lines": lines,
+            "total_items": total_items,
+            "subtotal": round(subtotal, 2),
+            "has_warnings": warnings > 0,
+            "updated_at": cart["updated_at"],
+            "generated_at": datetime.utcnow()
+        }
+
+
+# Instantiate global cart view
+cart_view = CartView()
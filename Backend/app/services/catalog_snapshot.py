@@ -0,0 +1,205 @@
+import os
+import json
+import mmap
+import stat
+import time
+import struct
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from bson import ObjectId
+
+from app.services.search_engine import search_engine, PostingSegment
+from app.services.facet_index import facet_index
+
+# File layout: MAGIC | header (catalog version, manifest length) | JSON manifest | arrays.
+# Arrays start on ARRAY_ALIGNMENT boundaries so they can be mapped in place.
+MAGIC = b"CATSNAP3"
+HEADER = struct.Struct("<QQ")
+ARRAY_ALIGNMENT = 64
+
+# Only plain numeric arrays are ever read back
+ARRAY_DTYPES = {"<i4", "<i8", "<f4", "<f8"}
+
+# Manifest lists holding product ids, which may be ObjectIds
+ID_FIELDS = {"doc_ids", "ids"}
+
+# Runtime data owned by the app user: never the source tree or a shared temp dir
+APP_CACHE_DIR = os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "sparkathon")
+SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH", os.path.join(APP_CACHE_DIR, "catalog.snapshot"))
+
+
+def _untrusted(st: os.stat_result) -> Optional[str]:
+    """Why a snapshot file or directory must not be used, or None if it is safe"""
+    if hasattr(os, "geteuid") and st.st_uid != os.geteuid():
+        return "not owned by the current user"
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return "writable by other users"
+    return None
+
+
+def _encode_ids(ids: List[Any]) -> Dict[str, Any]:
+    object_ids = [i for i, doc_id in enumerate(ids) if isinstance(doc_id, ObjectId)]
+    return {"values": [str(doc_id) if isinstance(doc_id, ObjectId) else doc_id for doc_id in ids], "object_ids": object_ids}
+
+
+def _decode_ids(encoded: Dict[str, Any]) -> List[Any]:
+    ids = list(encoded["values"])
+    for i in encoded["object_ids"]:
+        ids[i] = ObjectId(ids[i])
+    return ids
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+
+class CatalogSnapshot:
+    """Memory-mapped copy of the built search and facet indexes, tagged with the catalog version.
+
+    Written after each load or sync and read on startup: when the version
+    matches, a worker maps the posting arrays read-only, so workers on one
+    host share those pages through the page cache, and loads the facet rows
+    without scanning the products collection or re-tokenizing the catalog.
+    The file holds only JSON and raw numeric arrays, and is refused unless
+    it and its directory are owned by this user and not writable by others.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+
+    async def export(self, version: int) -> bool:
+        """Write the current indexes tagged with ``version``; skipped while they are still building"""
+        if not (search_engine.ready and facet_index.ready):
+            return False
+
+        started = time.perf_counter()
+        # Copy the indexes out on the event loop so no request mutates them mid-export
+        sections = {
+            "search": search_engine.export_segment(),
+            "facets": facet_index.export_columns()
+        }
+        size = await asyncio.get_running_loop().run_in_executor(None, self._write, version, sections)
+
+        print(
+            f"Catalog snapshot v{version} written with {search_engine.document_count} products "
+            f"({size} bytes) in {time.perf_counter() - started:.2f}s"
+        )
+        return True
+
+    def _directory(self) -> str:
+        """Create the snapshot directory if needed and make sure nobody else controls it"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        reason = _untrusted(os.stat(directory))
+        if reason:
+            raise PermissionError(f"Catalog snapshot directory {directory} is {reason}")
+        return directory
+
+    def _write(self, version: int, sections: Dict[str, Dict[str, Any]]) -> int:
+        self._directory()
+
+        manifest: Dict[str, Any] = {}
+        arrays: List[Tuple[int, np.ndarray]] = []
+        offset = 0
+        for name, section in sections.items():
+            values, layout = {}, {}
+            for key, value in section.items():
+                if isinstance(value, np.ndarray):
+                    array = np.ascontiguousarray(value, dtype=value.dtype.newbyteorder("<"))
+                    offset = _aligned(offset)
+                    layout[key] = {"dtype": array.dtype.str, "count": int(array.size), "offset": offset}
+                    arrays.append((offset, array))
+                    offset += array.nbytes
+                elif key in ID_FIELDS:
+                    values[key] = _encode_ids(value)
+                else:
+                    values[key] = value
+            manifest[name] = {"values": values, "arrays": layout}
+
+        encoded = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+        data_start = _aligned(len(MAGIC) + HEADER.size + len(encoded))
+
+        # Write to a private temp file and rename so readers never see a partial snapshot
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0), 0o600)
+        with os.fdopen(fd, "wb") as file:
+            file.write(MAGIC)
+            file.write(HEADER.pack(version, len(encoded)))
+            file.write(encoded)
+            for array_offset, array in arrays:
+                file.seek(data_start + array_offset)
+                file.write(array.tobytes())
+            size = file.tell()
+        os.replace(tmp_path, self.path)
+        return size
+
+    def read(self, expected_version: int) -> Optional[Dict[str, Any]]:
+        """The mapped ``search`` segment and ``facets`` columns if the snapshot matches ``expected_version``, else None"""
+        started = time.perf_counter()
+        try:
+            mapped = self._map()
+            if mapped is None:
+                return None
+            version, manifest, data_start = self._header(mapped)
+            if version != expected_version:
+                return None
+            sections = {name: self._section(mapped, section, data_start) for name, section in manifest.items()}
+            snapshot = {
+                "search": PostingSegment(**sections["search"]),
+                "facets": sections["facets"]
+            }
+        except Exception as e:
+            print(f"Warning: ignoring unusable catalog snapshot {self.path}: {e}")
+            return None
+        print(f"Catalog snapshot v{expected_version} mapped in {time.perf_counter() - started:.2f}s")
+        return snapshot
+
+    def _map(self) -> Optional[mmap.mmap]:
+        try:
+            fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+        except FileNotFoundError:
+            return None
+        try:
+            # Check the opened file itself, so it cannot be swapped after the check
+            reason = _untrusted(os.fstat(fd)) or _untrusted(os.stat(os.path.dirname(os.path.abspath(self.path))))
+            if reason:
+                raise PermissionError(f"snapshot is {reason}")
+            return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+    def _header(self, mapped: mmap.mmap) -> Tuple[int, Dict[str, Any], int]:
+        prefix = len(MAGIC) + HEADER.size
+        if len(mapped) < prefix or mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError("not a catalog snapshot")
+        version, manifest_length = HEADER.unpack_from(mapped, len(MAGIC))
+        if prefix + manifest_length > len(mapped):
+            raise ValueError("truncated manifest")
+        manifest = json.loads(mapped[prefix:prefix + manifest_length])
+        return version, manifest, _aligned(prefix + manifest_length)
+
+    def _section(self, mapped: mmap.mmap, section: Dict[str, Any], data_start: int) -> Dict[str, Any]:
+        """Manifest values plus read-only array views into the mapping"""
+        values = {
+            key: _decode_ids(value) if key in ID_FIELDS else value
+            for key, value in section["values"].items()
+        }
+        for key, layout in section["arrays"].items():
+            if layout["dtype"] not in ARRAY_DTYPES:
+                raise ValueError(f"unexpected array type {layout['dtype']!r}")
+            count, offset = int(layout["count"]), int(layout["offset"])
+            if count < 0 or offset < 0:
+                raise ValueError("negative array bounds")
+            if count == 0:
+                values[key] = np.empty(0, dtype=np.dtype(layout["dtype"]))
+                continue
+            # frombuffer raises if the range runs past the end of the file
+            values[key] = np.frombuffer(
+                mapped, dtype=np.dtype(layout["dtype"]), count=count, offset=data_start + offset
+            )
+        return values
+
+
+# Instantiate global catalog snapshot
+catalog_snapshot = CatalogSnapshot()
@@ -0,0 +1,155 @@
+import os
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.services.pagination import keyset_filter, keyset_sort, split_page
+
+# Retention: newest messages kept per user, and optional age limit (0 = keep forever)
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "1000"))
+CHAT_HISTORY_TTL_DAYS = int(os.getenv("CHAT_HISTORY_TTL_DAYS", "0"))
+# Recent turns left embedded in users.chat_history for the chatbot's conversation context
+CHAT_CONTEXT_KEEP = int(os.getenv("CHAT_CONTEXT_KEEP", "20"))
+
+MIGRATION_BATCH_SIZE = 500
+
+
+def _message_id(user_id: str, message: Dict[str, Any]) -> str:
+    """Deterministic id so moving the same embedded message twice is a no-op"""
+    timestamp = message.get("timestamp")
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat()
+    key = f"{user_id}|{timestamp}|{message.get('sender')}|{message.get('message')}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _public(message: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "sender": message.get("sender"),
+        "message": message.get("message"),
+        "timestamp": message.get("timestamp")
+    }
+
+
+class ChatStore:
+    """Chat messages in their own collection, one document per message, indexed on (user_id, timestamp)"""
+
+    def _document(self, user_id: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        timestamp = message.get("timestamp") or datetime.utcnow()
+        document = {
+            "_id": _message_id(user_id, {**message, "timestamp": timestamp}),
+            "user_id": user_id,
+            "sender": message.get("sender"),
+            "message": message.get("message"),
+            "timestamp": timestamp
+        }
+        if CHAT_HISTORY_TTL_DAYS:
+            document["expires_at"] = timestamp + timedelta(days=CHAT_HISTORY_TTL_DAYS)
+        return document
+
+    async def _insert(self, db: AsyncIOMotorDatabase, documents: List[Dict[str, Any]]) -> int:
+        """Insert messages, skipping ones already stored"""
+        if not documents:
+            return 0
+        try:
+            result = await db.chat_messages.insert_many(documents, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            # Duplicate key errors (code 11000) just mean the message was moved before
+            other = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+            if other:
+                raise
+            return e.details.get("nInserted", 0)
+
+    async def append(self, db: AsyncIOMotorDatabase, user_id: str, sender: str, message: str, timestamp: Optional[datetime] = None):
+        """Append-only write path for a single chat turn"""
+        await self._insert(db, [self._document(user_id, {"sender": sender, "message": message, "timestamp": timestamp})])
+        await self._enforce_cap(db, user_id)
+
+    async def sync_embedded(self, db: AsyncIOMotorDatabase, user_id: str) -> int:
+        """Move a user's embedded users.chat_history into the store.
+
+        Only turns newer than the user's newest stored message are inserted, so
+        the turns kept embedded for context are not written again every time.
+        The embedded array is trimmed to the last CHAT_CONTEXT_KEEP turns so the
+        user document stops growing while the chatbot keeps recent context.
+        """
+        try:
+            user_key = ObjectId(user_id)
+        except Exception:
+            return 0
+
+        user = await db.users.find_one({"_id": user_key}, {"chat_history": 1})
+        history = (user or {}).get("chat_history") or []
+        if not history:
+            return 0
+
+        newest = await db.chat_messages.find_one(
+            {"user_id": user_id}, {"timestamp": 1}, sort=keyset_sort("timestamp", -1)
+        )
+        if newest:
+            history = [
+                message for message in history
+                if isinstance(message.get("timestamp"), datetime) and message["timestamp"] > newest["timestamp"]
+            ]
+
+        moved = await self._insert(db, [self._document(user_id, message) for message in history])
+        if len(user["chat_history"]) > CHAT_CONTEXT_KEEP:
+            await db.users.update_one(
+                {"_id": user_key},
+                {"$push": {"chat_history": {"$each": [], "$slice": -CHAT_CONTEXT_KEEP}}}
+            )
+        if moved:
+            await self._enforce_cap(db, user_id)
+        return moved
+
+    async def _enforce_cap(self, db: AsyncIOMotorDatabase, user_id: str):
+        """Delete messages beyond the per-user retention cap"""
+        if CHAT_HISTORY_MAX_MESSAGES <= 0:
+            return
+        boundary = await db.chat_messages.find(
+            {"user_id": user_id}, {"timestamp": 1}
+        ).sort(keyset_sort("timestamp", -1)).skip(CHAT_HISTORY_MAX_MESSAGES).limit(1).to_list(1)
+        if boundary:
+            await db.chat_messages.delete_many({"user_id": user_id, "timestamp": {"$lte": boundary[0]["timestamp"]}})
+
+    async def get_history(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of history, oldest first, plus the cursor for the previous (older) page.
+
+        Raises ValueError for a malformed cursor.
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        if cursor:
+            query = keyset_filter(query, "timestamp", -1, cursor)
+
+        documents = await db.chat_messages.find(query).sort(keyset_sort("timestamp", -1)).limit(limit + 1).to_list(limit + 1)
+        documents, older_cursor = split_page(documents, "timestamp", limit)
+        return [_public(document) for document in reversed(documents)], older_cursor
+
+    async def clear(self, db: AsyncIOMotorDatabase, user_id: str) -> int:
+        result = await db.chat_messages.delete_many({"user_id": user_id})
+        return result.deleted_count
+
+    async def migrate_embedded_history(self, db: AsyncIOMotorDatabase) -> Dict[str, int]:
+        """Move every user's embedded chat_history into the store (safe to re-run)"""
+        stats = {"users": 0, "messages": 0}
+        cursor = db.users.find({"chat_history.0": {"$exists": True}}, {"_id": 1}).batch_size(MIGRATION_BATCH_SIZE)
+        async for user in cursor:
+            stats["messages"] += await self.sync_embedded(db, str(user["_id"]))
+            stats["users"] += 1
+        if stats["users"]:
+            print(f"Migrated {stats['messages']} chat messages for {stats['users']} users")
+        return stats
+
+
+# Instantiate global chat store
+chat_store = ChatStore()
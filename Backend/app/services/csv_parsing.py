@@ -0,0 +1,130 @@
+# CSV parsing for catalog ingest. Kept free of database and app-state imports
+# so these functions can run in ProcessPoolExecutor workers.
+import io
+import csv
+import json
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.taxonomy import category_fields
+
+
+def row_hash(row: Dict[str, str]) -> str:
+    """Stable hash of a raw CSV row, used to detect changed products"""
+    items = sorted((str(key), value) for key, value in row.items())
+    return hashlib.sha1(json.dumps(items, default=str).encode("utf-8")).hexdigest()
+
+
+def parse_csv_row(row: Dict[str, str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Map a CSV row into a product document.
+
+    Returns ``(product, None)`` on success or ``(None, reason)`` when the row is rejected.
+    """
+    try:
+        # Parse JSON-encoded list fields safely
+        def parse_json_list(field: str) -> List[Any]:
+            try:
+                parsed = json.loads(row.get(field, '[]') or '[]')
+                # Clean up any extra quotes in URLs
+                if field in ['image_urls']:
+                    return [url.strip('"') for url in parsed if url]
+                return parsed
+            except json.JSONDecodeError:
+                return []
+
+        # Clean image URL function
+        def clean_image_url(url: str) -> str:
+            if url:
+                return url.strip().strip('"')
+            return ""
+
+        # Main fields
+        product = {
+            "_id": row.get("product_id"),
+            "name": row.get("product_name", "").strip(),
+            "description": row.get("description", "").strip(),
+            "price": float(row.get("final_price", 0)),
+            "currency": row.get("currency", "").strip(),
+            "category": row.get("category_name", "").strip(),
+            "root_category_name": row.get("root_category_name", "").strip(),
+            "brand": row.get("brand", "").strip(),
+            "rating": float(row.get("rating", 0)),
+            "review_count": int(row.get("review_count", 0)),
+            # Set default stock quantity to 100 if not specified or 0
+            "stock_quantity": int(row.get("stock_quantity", 100)) or 100,
+            # JSON fields
+            "specifications": parse_json_list("specifications"),
+            "image_urls": parse_json_list("image_urls"),
+            "main_image": clean_image_url(row.get("main_image", "")),
+            "tags": parse_json_list("tags"),
+            "free_returns": row.get("free_returns", "").strip(),
+            "sizes": parse_json_list("sizes"),
+            "colors": parse_json_list("colors"),
+            "ingredients": parse_json_list("ingredients"),
+            "content_hash": row_hash(row),
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        }
+
+        # Validate
+        if not product["name"]:
+            return None, "missing product name"
+        if product["price"] <= 0:
+            return None, "non-positive price"
+
+        # Normalized taxonomy keys for indexed category filters
+        product.update(category_fields(product["category"], product["root_category_name"]))
+
+        return product, None
+
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def csv_chunk_ranges(file_path: str, chunk_bytes: int) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """Split a CSV file into byte ranges that each hold whole records.
+
+    Returns the header line and the (start, end) offsets of each chunk. A cut is
+    only made after a newline with an even number of quotes seen so far, so
+    quoted fields containing newlines are never split.
+    """
+    ranges: List[Tuple[int, int]] = []
+    with open(file_path, "rb") as file:
+        header = file.readline()
+        start = position = file.tell()
+        quotes = 0
+        for line in file:
+            quotes += line.count(b'"')
+            position += len(line)
+            if position - start >= chunk_bytes and quotes % 2 == 0:
+                ranges.append((start, position))
+                start = position
+        if position > start:
+            ranges.append((start, position))
+    return header, ranges
+
+
+def parse_csv_chunk(file_path: str, header: bytes, start: int, end: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]:
+    """Parse one byte range of a CSV file (runs in a worker process).
+
+    Returns the parsed products, the rejected rows and the number of rows read.
+    """
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+
+    text = (header + data).decode("utf-8")
+    products: List[Dict[str, Any]] = []
+    rejects: List[Dict[str, Any]] = []
+    rows_read = 0
+
+    for row in csv.DictReader(io.StringIO(text, newline="")):
+        rows_read += 1
+        product, reason = parse_csv_row(row)
+        if product is None:
+            rejects.append({"product_id": row.get("product_id"), "reason": reason})
+        else:
+            products.append(product)
+
+    return products, rejects, rows_read
@@ -1,109 +1,512 @@
 import csv
+import itertools
 import json
+import time
 import asyncio
-from typing import List, Dict, Any
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterator, AsyncIterator, Optional, Tuple
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 import os
 
+from app.services.search_engine import search_engine
+from app.services.product_cache import product_cache
+from app.services.facet_index import facet_index
+from app.services.inventory import inventory_manager
+from app.services.taxonomy import category_fields
+from app.services.catalog_snapshot import catalog_snapshot, APP_CACHE_DIR
+from app.services.csv_parsing import parse_csv_row, csv_chunk_ranges, parse_csv_chunk
+
+# Streaming ingest configuration
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+# Parsed batches allowed to wait for the inserter before the reader pauses
+INGEST_MAX_PENDING_BATCHES = int(os.getenv("INGEST_MAX_PENDING_BATCHES", "2"))
+# Parallel parsing: worker processes (1 = parse serially in a worker thread) and chunk size
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+INGEST_CHUNK_BYTES = int(os.getenv("INGEST_CHUNK_BYTES", str(4 * 1024 * 1024)))
+# JSON-lines file receiving every rejected row (empty to disable)
+INGEST_REJECT_REPORT = os.getenv("INGEST_REJECT_REPORT", os.path.join(APP_CACHE_DIR, "ingest-rejects.jsonl")) or None
+# Rejected rows described in the load log
+REJECT_LOG_LIMIT = 5
+# Rejected rows kept in the returned stats
+REJECT_SAMPLE_LIMIT = 100
+# Run a delta sync against the CSV on startup when products already exist
+CATALOG_SYNC_ON_STARTUP = os.getenv("CATALOG_SYNC_ON_STARTUP", "false").lower() == "true"
+# Seconds between checks for catalog changes made by other worker processes
+CATALOG_VERSION_POLL_INTERVAL = float(os.getenv("CATALOG_VERSION_POLL_INTERVAL", "15"))
+
 class DataLoader:
     def __init__(self):
         # Base path three levels up
         self.base_path = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
         self.datasets_path = os.path.join(self.base_path, "datasets")
+        # Last catalog version seen by this process
+        self.catalog_version = 0
 
     async def load_products_from_csv(self, db: AsyncIOMotorDatabase, file_path: str = None):
         """Load products from CSV file using updated Walmart schema"""
+        if file_path is None:
+            file_path = os.path.join(self.datasets_path, "walmart-products.csv")
+
         # Check if products already exist in the database
         existing_count = await db.products.count_documents({})
         if existing_count > 0:
+            if CATALOG_SYNC_ON_STARTUP and os.path.exists(file_path):
+                await self.sync_products_from_csv(db, file_path)
+                return
             print(f"Products already exist in database ({existing_count} products). Skipping data load.")
+            await self.get_catalog_version(db)
             return
 
-        if file_path is None:
-            file_path = os.path.join(self.datasets_path, "walmart-products.csv")
-
         if not os.path.exists(file_path):
             print(f"CSV file not found: {file_path}")
             await self.load_sample_products(db)
             return
 
         try:
-            products = []
-            with open(file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    product = self._process_csv_row(row)
-                    if product:
-                        products.append(product)
+            stats = await self.ingest_csv(db, file_path)
+        except Exception as e:
+            # ingest_csv only raises when nothing was inserted
+            print(f"Error loading CSV: {e}")
+            await self.load_sample_products(db)
+            return
+
+        if stats["rows_rejected"]:
+            reasons = Counter(reject["reason"] for reject in stats["reject_samples"])
+            print(
+                f"Warning: {stats['rows_rejected']} CSV rows rejected "
+                f"(most common in sample: {', '.join(f'{reason} x{count}' for reason, count in reasons.most_common(REJECT_LOG_LIMIT))}); "
+                f"full list in {stats.get('reject_report') or 'the ingest stats (INGEST_REJECT_REPORT is disabled)'}"
+            )
+
+        if stats["inserted"] == 0:
+            print("No valid products found in CSV, loading samples.")
+            await self.load_sample_products(db)
+        elif stats.get("error"):
+            # Never mix samples into a partial catalog; a delta sync fills in the missing rows
+            print(
+                f"Error: CSV load stopped after {stats['inserted']} products ({stats['error']}). "
+                f"Keeping the partial catalog; run a catalog sync to load the rest."
+            )
+
+    def _iter_csv_rows(self, file_path: str) -> Iterator[Dict[str, str]]:
+        """Yield CSV rows lazily so memory does not grow with file size"""
+        with open(file_path, 'r', encoding='utf-8', newline='') as file:
+            for row in csv.DictReader(file):
+                yield row
+
+    async def ingest_csv(
+        self,
+        db: AsyncIOMotorDatabase,
+        file_path: str,
+        batch_size: int = INGEST_BATCH_SIZE,
+        workers: int = INGEST_WORKERS,
+        chunk_bytes: int = INGEST_CHUNK_BYTES,
+        reject_report: Optional[str] = INGEST_REJECT_REPORT
+    ) -> Dict[str, Any]:
+        """Stream a CSV file into the products collection in bounded, unordered batches.
+
+        Parsing and inserting overlap through a bounded queue; the reader waits
+        when INGEST_MAX_PENDING_BATCHES batches are queued. A failing batch is
+        counted and skipped instead of aborting the load. With ``workers > 1``
+        rows are parsed in a process pool, chunk by chunk, in file order.
+        Rejected rows go to ``reject_report`` (JSON lines) and a sample is
+        returned in the stats. If parsing or inserting fails partway, the
+        batches already inserted are kept and accounted for (cache cleared,
+        catalog version bumped) and the failure is returned as ``error``;
+        the exception is only raised when nothing was inserted.
+        """
+        stats = {
+            "rows_read": 0,
+            "rows_rejected": 0,
+            "batches": 0,
+            "inserted": 0,
+            "insert_errors": 0,
+            "failed_batches": 0,
+            "workers": max(workers, 1),
+            "elapsed_seconds": 0.0,
+            "rows_per_second": 0.0,
+            "reject_samples": []
+        }
+        started = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_MAX_PENDING_BATCHES)
+        report_file = None
+
+        def record_rejects(rejects: List[Dict[str, Any]]):
+            nonlocal report_file
+            stats["rows_rejected"] += len(rejects)
+            room = REJECT_SAMPLE_LIMIT - len(stats["reject_samples"])
+            if room > 0:
+                stats["reject_samples"].extend(rejects[:room])
+            if reject_report and report_file is None:
+                # Opened on the first reject, so clean loads leave no file behind
+                os.makedirs(os.path.dirname(os.path.abspath(reject_report)), exist_ok=True)
+                report_file = open(reject_report, "a", encoding="utf-8")
+                stats["reject_report"] = reject_report
+            if report_file:
+                for reject in rejects:
+                    report_file.write(json.dumps(reject, default=str) + "\n")
+
+        async def inserter():
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                await self._insert_batch(db, batch, stats, started)
+
+        if workers > 1:
+            parsed = self._parse_parallel(file_path, workers, chunk_bytes, batch_size, stats, record_rejects)
+        else:
+            parsed = self._parse_serial(file_path, batch_size, stats, record_rejects)
 
+        worker = asyncio.create_task(inserter())
+        failure: Optional[Exception] = None
+
+        async def hand_off(batch):
+            # Blocks while the inserter is behind (backpressure), but not on an
+            # inserter that died: its error is raised here instead of hanging
+            put = asyncio.ensure_future(queue.put(batch))
+            await asyncio.wait({put, worker}, return_when=asyncio.FIRST_COMPLETED)
+            if not put.done():
+                put.cancel()
+                worker.result()
+                raise RuntimeError("CSV inserter stopped before the load finished")
+
+        try:
+            async for products in parsed:
+                for start in range(0, len(products), batch_size):
+                    await hand_off(products[start:start + batch_size])
+                    # Let the inserter start its I/O before parsing the next batch
+                    await asyncio.sleep(0)
+            await hand_off(None)
+            await worker
+        except Exception as e:
+            failure = e
+            stats["error"] = str(e)
+        finally:
+            if not worker.done():
+                worker.cancel()
+            if report_file:
+                report_file.close()
+
+        if failure is not None and not stats["inserted"]:
+            raise failure
+
+        product_cache.clear()
+        if stats["inserted"]:
+            details = {"inserted": stats["inserted"]}
+            if failure is not None:
+                details["partial"] = True
+            await self._bump_catalog_version(db, "load", **details)
+
+        elapsed = time.perf_counter() - started
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["rows_per_second"] = round(stats["rows_read"] / elapsed, 1) if elapsed else 0.0
+        print(
+            f"Loaded {stats['inserted']} products from CSV in {stats['batches']} batches "
+            f"({stats['rows_rejected']} rows rejected, {stats['insert_errors']} insert errors, "
+            f"{stats['rows_per_second']} rows/s, {stats['workers']} parser workers)"
+        )
+        return stats
+
+    async def _parse_serial(self, file_path: str, batch_size: int, stats: Dict[str, Any], record_rejects) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Parse rows in a worker thread, one batch at a time, yielding batches of products"""
+        loop = asyncio.get_running_loop()
+        rows = self._iter_csv_rows(file_path)
+        while True:
+            products, rejects, rows_read = await loop.run_in_executor(None, self._parse_rows, rows, batch_size)
+            stats["rows_read"] += rows_read
+            if rejects:
+                record_rejects(rejects)
             if products:
-                result = await db.products.insert_many(products)
-                print(f"Loaded {len(result.inserted_ids)} products from CSV")
+                yield products
+            if rows_read < batch_size:
+                return
+
+    def _parse_rows(self, rows: Iterator[Dict[str, str]], count: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]:
+        """Parse up to ``count`` rows; returns the products, the rejected rows and the rows read"""
+        products, rejects = [], []
+        rows_read = 0
+        for row in itertools.islice(rows, count):
+            rows_read += 1
+            product, reason = parse_csv_row(row)
+            if product is None:
+                rejects.append({"product_id": row.get("product_id"), "reason": reason})
             else:
-                print("No valid products found in CSV, loading samples.")
-                await self.load_sample_products(db)
+                products.append(product)
+        return products, rejects, rows_read
+
+    async def _parse_parallel(
+        self,
+        file_path: str,
+        workers: int,
+        chunk_bytes: int,
+        batch_size: int,
+        stats: Dict[str, Any],
+        record_rejects
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Parse byte-range chunks in a process pool, yielding each chunk's products in file order.
 
+        At most ``2 * workers`` chunks are in flight, which bounds memory.
+        """
+        loop = asyncio.get_running_loop()
+        header, ranges = await loop.run_in_executor(None, csv_chunk_ranges, file_path, chunk_bytes)
+
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(ranges)) or 1)
+        try:
+            pending = deque()
+            next_range = 0
+            while next_range < len(ranges) or pending:
+                while next_range < len(ranges) and len(pending) < 2 * workers:
+                    start, end = ranges[next_range]
+                    pending.append(loop.run_in_executor(pool, parse_csv_chunk, file_path, header, start, end))
+                    next_range += 1
+
+                products, rejects, rows_read = await pending.popleft()
+                stats["rows_read"] += rows_read
+                if rejects:
+                    record_rejects(rejects)
+                yield products
+        finally:
+            # Leaving a `with` block would join the workers on the event loop thread
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _insert_batch(self, db: AsyncIOMotorDatabase, batch: List[Dict[str, Any]], stats: Dict[str, Any], started: float):
+        """Insert one batch, recording which documents made it in"""
+        stats["batches"] += 1
+        failed_indexes = set()
+
+        try:
+            await db.products.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Unordered inserts keep going past bad documents (e.g. duplicate ids)
+            failed_indexes = {error["index"] for error in e.details.get("writeErrors", [])}
+            stats["insert_errors"] += len(failed_indexes)
         except Exception as e:
-            print(f"Error loading CSV: {e}")
-            await self.load_sample_products(db)
+            print(f"Batch {stats['batches']} failed: {e}")
+            stats["failed_batches"] += 1
+            stats["insert_errors"] += len(batch)
+            return
 
-    def _process_csv_row(self, row: Dict[str, str]) -> Dict[str, Any]:
-        """Map new CSV schema into product document"""
+        inserted = [product for i, product in enumerate(batch) if i not in failed_indexes]
+        stats["inserted"] += len(inserted)
+        search_engine.upsert_many(inserted)
+        facet_index.upsert_many(inserted)
+        # A reload keeps existing inventory counters; move them to the reloaded stock
+        await self._apply_feed_stock(db, inserted)
+
+        elapsed = time.perf_counter() - started
+        rate = stats["rows_read"] / elapsed if elapsed else 0.0
+        print(
+            f"Batch {stats['batches']}: inserted {len(inserted)}/{len(batch)} "
+            f"(total {stats['inserted']}, {rate:.0f} rows/s)"
+        )
+
+    async def sync_products_from_csv(
+        self,
+        db: AsyncIOMotorDatabase,
+        file_path: str = None,
+        soft_delete: bool = False,
+        batch_size: int = INGEST_BATCH_SIZE,
+        workers: int = INGEST_WORKERS,
+        chunk_bytes: int = INGEST_CHUNK_BYTES
+    ) -> Dict[str, Any]:
+        """Apply only the differences between the CSV feed and the products collection.
+
+        Rows whose content hash matches the stored one are skipped; new or changed
+        rows are upserted with unordered bulk_write batches. With ``soft_delete``,
+        products missing from the feed are flagged ``deleted`` rather than removed.
+        The catalog version is bumped when anything changed. Rows are parsed
+        with the ingest pipeline, which yields to the event loop after every
+        batch (or parses in a process pool with ``workers > 1``), so requests
+        keep being served during a sync.
+        """
+        if file_path is None:
+            file_path = os.path.join(self.datasets_path, "walmart-products.csv")
+
+        started = time.perf_counter()
+        stats = {
+            "rows_read": 0,
+            "rows_rejected": 0,
+            "unchanged": 0,
+            "upserted": 0,
+            "write_errors": 0,
+            "soft_deleted": 0,
+            "catalog_version": self.catalog_version,
+            "elapsed_seconds": 0.0
+        }
+
+        # _id -> (content_hash, deleted) for everything currently stored
+        existing = {}
+        async for doc in db.products.find({}, {"content_hash": 1, "deleted": 1}):
+            existing[doc["_id"]] = (doc.get("content_hash"), doc.get("deleted", False))
+
+        def record_rejects(rejects: List[Dict[str, Any]]):
+            stats["rows_rejected"] += len(rejects)
+
+        if workers > 1:
+            parsed = self._parse_parallel(file_path, workers, chunk_bytes, batch_size, stats, record_rejects)
+        else:
+            parsed = self._parse_serial(file_path, batch_size, stats, record_rejects)
+
+        seen = set()
+        operations = []
+        changed = []
+
+        async for products in parsed:
+            for product in products:
+                seen.add(product["_id"])
+                previous = existing.get(product["_id"])
+                if previous and previous[0] == product["content_hash"] and not previous[1]:
+                    stats["unchanged"] += 1
+                    continue
+
+                created_at = product.pop("created_at")
+                fields = {key: value for key, value in product.items() if key != "_id"}
+                fields["deleted"] = False
+                operations.append(UpdateOne(
+                    {"_id": product["_id"]},
+                    {"$set": fields, "$setOnInsert": {"created_at": created_at}},
+                    upsert=True
+                ))
+                changed.append(product)
+
+                if len(operations) >= batch_size:
+                    await self._apply_sync_batch(db, operations, changed, stats)
+                    operations, changed = [], []
+
+            # An unchanged feed writes nothing; still let other requests run between batches
+            await asyncio.sleep(0)
+
+        if operations:
+            await self._apply_sync_batch(db, operations, changed, stats)
+
+        if soft_delete:
+            missing = [doc_id for doc_id, (_, deleted) in existing.items() if doc_id not in seen and not deleted]
+            for start in range(0, len(missing), batch_size):
+                chunk = missing[start:start + batch_size]
+                result = await db.products.update_many(
+                    {"_id": {"$in": chunk}},
+                    {"$set": {"deleted": True, "deleted_at": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+                )
+                stats["soft_deleted"] += result.modified_count
+                for doc_id in chunk:
+                    search_engine.remove(doc_id)
+                facet_index.remove_many(chunk)
+                product_cache.invalidate_many(chunk)
+
+        if stats["upserted"] or stats["soft_deleted"]:
+            stats["catalog_version"] = await self._bump_catalog_version(
+                db, "sync", upserted=stats["upserted"], soft_deleted=stats["soft_deleted"]
+            )
+
+        stats["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        print(
+            f"Catalog sync: {stats['upserted']} upserted, {stats['unchanged']} unchanged, "
+            f"{stats['soft_deleted']} soft-deleted, {stats['write_errors']} errors "
+            f"in {stats['elapsed_seconds']}s (version {stats['catalog_version']})"
+        )
+        return stats
+
+    async def _apply_sync_batch(
+        self,
+        db: AsyncIOMotorDatabase,
+        operations: List[UpdateOne],
+        changed: List[Dict[str, Any]],
+        stats: Dict[str, Any]
+    ):
+        """Write one batch of upserts and refresh the in-memory indexes for it"""
+        failed_indexes = set()
         try:
-            # Parse JSON-encoded list fields safely
-            def parse_json_list(field: str) -> List[Any]:
-                try:
-                    parsed = json.loads(row.get(field, '[]') or '[]')
-                    # Clean up any extra quotes in URLs
-                    if field in ['image_urls']:
-                        return [url.strip('"') for url in parsed if url]
-                    return parsed
-                except json.JSONDecodeError:
-                    return []
-
-            # Clean image URL function
-            def clean_image_url(url: str) -> str:
-                if url:
-                    return url.strip().strip('"')
-                return ""
-
-            # Main fields
-            product = {
-                "_id": row.get("product_id"),
-                "name": row.get("product_name", "").strip(),
-                "description": row.get("description", "").strip(),
-                "price": float(row.get("final_price", 0)),
-                "currency": row.get("currency", "").strip(),
-                "category": row.get("category_name", "").strip(),
-                "root_category_name": row.get("root_category_name", "").strip(),
-                "brand": row.get("brand", "").strip(),
-                "rating": float(row.get("rating", 0)),
-                "review_count": int(row.get("review_count", 0)),
-                # Set default stock quantity to 100 if not specified or 0
-                "stock_quantity": int(row.get("stock_quantity", 100)) or 100,
-                # JSON fields
-                "specifications": parse_json_list("specifications"),
-                "image_urls": parse_json_list("image_urls"),
-                "main_image": clean_image_url(row.get("main_image", "")),
-                "tags": parse_json_list("tags"),
-                "free_returns": row.get("free_returns", "").strip(),
-                "sizes": parse_json_list("sizes"),
-                "colors": parse_json_list("colors"),
-                "ingredients": parse_json_list("ingredients"),
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
+            await db.products.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            failed_indexes = {error["index"] for error in e.details.get("writeErrors", [])}
+            stats["write_errors"] += len(failed_indexes)
+
+        applied = [product for i, product in enumerate(changed) if i not in failed_indexes]
+        stats["upserted"] += len(applied)
+        search_engine.upsert_many(applied)
+        facet_index.upsert_many(applied)
+        product_cache.invalidate_many(product["_id"] for product in applied)
+        await self._apply_feed_stock(db, applied)
+
+    async def _apply_feed_stock(self, db: AsyncIOMotorDatabase, products: List[Dict[str, Any]]):
+        """Hand the feed's stock levels to the inventory counters, which own stock once seeded"""
+        stocks = {str(product["_id"]): product.get("stock_quantity", 0) for product in products}
+        try:
+            await inventory_manager.apply_feed_stock(db, stocks)
+        except Exception as e:
+            print(f"Warning: failed to apply feed stock to inventory counters: {e}")
+
+    async def get_catalog_version(self, db: AsyncIOMotorDatabase) -> int:
+        """Current catalog version; downstream caches compare it to decide when to rebuild"""
+        meta = await db.catalog_meta.find_one({"_id": "catalog"})
+        self.catalog_version = meta["version"] if meta else 0
+        return self.catalog_version
+
+    async def refresh_if_stale(self, db: AsyncIOMotorDatabase) -> bool:
+        """Rebuild this process's catalog-derived state if another process changed the catalog.
+
+        Returns True when a newer version was found and the product cache,
+        search index and facet index were refreshed for it.
+        """
+        if not (search_engine.ready and facet_index.ready):
+            # Still warming up; the warmup build reads the current catalog anyway
+            return False
+
+        meta = await db.catalog_meta.find_one({"_id": "catalog"}, {"version": 1})
+        version = meta["version"] if meta else 0
+        if version == self.catalog_version:
+            return False
 
-            # Validate
-            if not product["name"] or product["price"] <= 0:
-                return None
+        previous = self.catalog_version
+        self.catalog_version = version
+        product_cache.clear()
+        # The process that made the change normally wrote a snapshot for it already
+        snapshot = await asyncio.get_running_loop().run_in_executor(None, catalog_snapshot.read, version)
+        await search_engine.build(db, snapshot and snapshot["search"])
+        await facet_index.build(db, snapshot and snapshot["facets"])
+        print(f"Catalog changed from v{previous} to v{version}; refreshed caches and indexes")
+        return True
 
-            return product
+    async def watch_catalog_version(self, db: AsyncIOMotorDatabase, interval: float = CATALOG_VERSION_POLL_INTERVAL):
+        """Background loop: pick up loads and syncs made by other worker processes"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_if_stale(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in catalog version watcher: {e}")
 
+    async def _bump_catalog_version(self, db: AsyncIOMotorDatabase, reason: str, **details) -> int:
+        meta = await db.catalog_meta.find_one_and_update(
+            {"_id": "catalog"},
+            {
+                "$inc": {"version": 1},
+                "$set": {"updated_at": datetime.utcnow(), "last_change": {"reason": reason, **details}}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self.catalog_version = meta["version"]
+
+        # Refresh the warm-start snapshot for the new version
+        try:
+            await catalog_snapshot.export(self.catalog_version)
         except Exception as e:
-            print(f"Error processing row for product_id={row.get('product_id')}: {e}")
-            return None
+            print(f"Warning: failed to write catalog snapshot: {e}")
+
+        return self.catalog_version
+
+    def _process_csv_row(self, row: Dict[str, str]) -> Dict[str, Any]:
+        """Map new CSV schema into product document"""
+        product, _ = parse_csv_row(row)
+        return product
 
     async def load_sample_products(self, db: AsyncIOMotorDatabase):
         """Load hardcoded sample products if CSV missing or invalid"""
@@ -138,21 +541,14 @@ class DataLoader:
             }
             # add more samples if needed
         ]
+        for product in sample_products:
+            product.update(category_fields(product.get("category"), product.get("root_category_name")))
         result = await db.products.insert_many(sample_products)
+        search_engine.upsert_many(sample_products)
+        product_cache.clear()
+        facet_index.upsert_many(sample_products)
+        await self._bump_catalog_version(db, "samples", inserted=len(result.inserted_ids))
         print(f"Loaded {len(result.inserted_ids)} sample products")
 
-    async def create_indexes(self, db: AsyncIOMotorDatabase):
-        """Ensure indexes for optimized queries"""
-        try:
-            # Text search index
-            await db.products.create_index([("name", "text"), ("description", "text"), ("tags", "text")])
-            # Single-field indexes
-            for field in ["category", "brand", "price", "rating"]:
-                await db.products.create_index(field)
-            # _id index is created automatically, don't need to specify unique
-            print("Indexes created successfully")
-        except Exception as e:
-            print(f"Error creating indexes: {e}")
-
 # Instantiate global loader
 data_loader = DataLoader()
\ No newline at end of file
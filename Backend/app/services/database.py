@@ -1,5 +1,4 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import IndexModel
 import os
 from dotenv import load_dotenv
 
@@ -8,19 +7,38 @@ load_dotenv()
 class Database:
     client: AsyncIOMotorClient = None
     database = None
+    # Whether the server accepts multi-document transactions (replica set or mongos); None until checked
+    transactions: bool = None
 
 db = Database()
 
 async def get_database():
     return db.database
 
+async def supports_transactions() -> bool:
+    """Multi-document transactions need a replica set member or mongos"""
+    if db.transactions is None:
+        hello = await db.client.admin.command("hello")
+        db.transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        if not db.transactions:
+            print("Warning: MongoDB is a standalone server, multi-document writes run without transactions")
+    return db.transactions
+
+async def run_in_transaction(callback):
+    """Run ``await callback(session)`` inside a multi-document transaction.
+
+    with_transaction retries transient errors. On a standalone server the
+    callback runs once with session=None.
+    """
+    if not await supports_transactions():
+        return await callback(None)
+    async with await db.client.start_session() as session:
+        return await session.with_transaction(callback)
+
 async def connect_to_mongo():
     """Create database connection"""
     db.client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
     db.database = db.client[os.getenv("DATABASE_NAME", "walmart_sparkathon")]
-    
-    # Create indexes for better performance
-    await create_indexes()
     print("Connected to MongoDB")
 
 async def close_mongo_connection():
@@ -28,26 +46,3 @@ async def close_mongo_connection():
     if db.client:
         db.client.close()
         print("Disconnected from MongoDB")
-
-async def create_indexes():
-    """Create database indexes for optimal performance"""
-    database = db.database
-    
-    # User collection indexes
-    await database.users.create_index("email", unique=True)
-    await database.users.create_index("username", unique=True)
-    
-    # Product collection indexes
-    await database.items.create_index("product_id", unique=True)
-    await database.items.create_index("category_name")
-    await database.items.create_index("brand")
-    await database.items.create_index([("product_name", "text"), ("description", "text")])
-    
-    # Cart collection indexes
-    await database.carts.create_index("user_id", unique=True)
-    
-    # Purchase collection indexes
-    await database.purchases.create_index("user_id")
-    await database.purchases.create_index([("user_id", 1), ("date", -1)])
-    
-    print("Database indexes created")
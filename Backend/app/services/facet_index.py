@@ -0,0 +1,327 @@
+import re
+import bisect
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.services.taxonomy import slugify, category_fields
+
+# Upper edges of the price histogram buckets; the last bucket is open-ended
+PRICE_BUCKET_EDGES = [10, 25, 50, 100, 250, 500, 1000]
+
+# Number of distinct filter combinations whose counts are memoized
+FACET_COUNT_CACHE_SIZE = 256
+
+FACET_PROJECTION = {"category": 1, "root_category_name": 1, "category_path": 1, "brand": 1, "price": 1, "name": 1, "rating": 1}
+
+# Listing sort fields the rows can order search hits by
+SORT_FIELDS = ("name", "price", "rating")
+
+
+def _pattern(value: Optional[str]):
+    """Case-insensitive matcher equivalent to the brand $regex filter in the product routes"""
+    if not value:
+        return None
+    try:
+        return re.compile(value, re.IGNORECASE)
+    except re.error:
+        return re.compile(re.escape(value), re.IGNORECASE)
+
+
+def _bucket_label(index: int) -> str:
+    low = PRICE_BUCKET_EDGES[index - 1] if index > 0 else 0
+    if index == len(PRICE_BUCKET_EDGES):
+        return f"{low}+"
+    return f"{low}-{PRICE_BUCKET_EDGES[index]}"
+
+
+class FacetIndex:
+    """Catalog facets (categories, brands, price histogram) computed once and kept in memory"""
+
+    def __init__(self):
+        # product _id -> compact facet row
+        self.rows: Dict[Any, Dict[str, Any]] = {}
+        self._summary: Optional[Dict[str, Any]] = None
+        self._count_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.ready = False
+
+    async def build(self, db: AsyncIOMotorDatabase, columns: Optional[Dict[str, Any]] = None):
+        """Load facet fields for the whole catalog, replacing the current index.
+
+        ``columns`` (from ``export_columns``, e.g. via the catalog snapshot) skips the collection scan.
+        """
+        self.rows = {}
+        if columns is not None:
+            try:
+                self.load_columns(columns)
+            except (KeyError, ValueError) as e:
+                # e.g. a snapshot written before a column was added
+                print(f"Warning: unusable facet columns in the catalog snapshot ({e}); scanning products")
+                self.rows = {}
+                columns = None
+        if columns is None:
+            async for product in db.products.find({"deleted": {"$ne": True}}, FACET_PROJECTION):
+                self._add(product)
+        self._invalidate()
+        self.ready = True
+        print(f"Facet index built with {len(self.rows)} products")
+
+    def _add(self, product: Dict[str, Any]):
+        category_path = product.get("category_path")
+        if category_path is None:
+            category_path = category_fields(product.get("category"), product.get("root_category_name"))["category_path"]
+        self.rows[product["_id"]] = {
+            "category": product.get("category") or "",
+            "root_category_name": product.get("root_category_name") or "",
+            "category_path": category_path,
+            "brand": product.get("brand") or "",
+            "price": product.get("price") or 0,
+            # Sort keys for search listings with an explicit sort_by
+            "name": product.get("name") or "",
+            "rating": product.get("rating") or 0,
+        }
+
+    def export_columns(self) -> Dict[str, Any]:
+        """The rows as columns: ids, string tables and per-row codes into them"""
+        strings: Dict[str, int] = {}
+        paths: Dict[tuple, int] = {}
+        ids = list(self.rows)
+        codes = {field: np.empty(len(ids), dtype=np.int32) for field in ("category", "root_category_name", "brand", "name", "category_path")}
+        numbers = {field: np.empty(len(ids), dtype=np.float64) for field in ("price", "rating")}
+        for i, product_id in enumerate(ids):
+            row = self.rows[product_id]
+            for field in ("category", "root_category_name", "brand", "name"):
+                codes[field][i] = strings.setdefault(row[field], len(strings))
+            codes["category_path"][i] = paths.setdefault(tuple(row["category_path"]), len(paths))
+            for field in numbers:
+                numbers[field][i] = row[field]
+        return {
+            "ids": ids,
+            "strings": list(strings),
+            "paths": [list(path) for path in paths],
+            **codes,
+            **numbers
+        }
+
+    def load_columns(self, columns: Dict[str, Any]):
+        """Rebuild the rows from ``export_columns`` output; raises ValueError if the columns do not line up"""
+        ids, strings, paths = columns["ids"], columns["strings"], columns["paths"]
+        fields = ("category", "root_category_name", "brand", "name", "category_path", "price", "rating")
+        if any(len(columns[field]) != len(ids) for field in fields):
+            raise ValueError("Facet columns do not line up")
+        if ids and any(int(columns[field].min()) < 0 for field in fields[:5]):
+            raise ValueError("Facet columns refer to unknown strings")
+        try:
+            self.rows = {
+                product_id: {
+                    "category": strings[category],
+                    "root_category_name": strings[root],
+                    "category_path": list(paths[path]),
+                    "brand": strings[brand],
+                    "price": price,
+                    "name": strings[name],
+                    "rating": rating,
+                }
+                for product_id, category, root, brand, name, path, price, rating in zip(
+                    ids, *(columns[field].tolist() for field in fields)
+                )
+            }
+        except IndexError:
+            raise ValueError("Facet columns refer to unknown strings")
+
+    def _invalidate(self):
+        self._summary = None
+        self._count_cache.clear()
+
+    def upsert_many(self, products: Iterable[Dict[str, Any]]):
+        for product in products:
+            self._add(product)
+        self._invalidate()
+
+    def remove_many(self, product_ids: Iterable[Any]):
+        for product_id in product_ids:
+            self.rows.pop(product_id, None)
+        self._invalidate()
+
+    def summary(self) -> Dict[str, Any]:
+        """Everything /categories/list returns, plus root categories, a price histogram and the category tree"""
+        if self._summary is None:
+            categories = set()
+            root_categories = set()
+            brands = set()
+            prices = []
+            # root slug -> {"name", "count", children: {slug: {"name", "count"}}}
+            tree: Dict[str, Dict[str, Any]] = {}
+            for row in self.rows.values():
+                categories.add(row["category"])
+                categories.add(row["root_category_name"])
+                root_categories.add(row["root_category_name"])
+                brands.add(row["brand"])
+                prices.append(row["price"])
+
+                path = row["category_path"]
+                if not path:
+                    continue
+                root = tree.setdefault(path[0], {"name": row["root_category_name"] or row["category"], "count": 0, "children": {}})
+                root["count"] += 1
+                if len(path) > 1:
+                    child = root["children"].setdefault(path[1], {"name": row["category"], "count": 0})
+                    child["count"] += 1
+
+            self._summary = {
+                "categories": sorted(c for c in categories if c),
+                "root_categories": sorted(c for c in root_categories if c),
+                "brands": sorted(b for b in brands if b),
+                "price_range": {
+                    "min": min(prices) if prices else 0,
+                    "max": max(prices) if prices else 1000
+                },
+                "price_buckets": self._histogram(self.rows.values()),
+                "taxonomy": [
+                    {
+                        "slug": slug,
+                        "name": root["name"],
+                        "count": root["count"],
+                        "children": [
+                            {"slug": child_slug, "name": child["name"], "count": child["count"]}
+                            for child_slug, child in sorted(root["children"].items())
+                        ]
+                    }
+                    for slug, root in sorted(tree.items())
+                ]
+            }
+        return self._summary
+
+    def _histogram(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        counts = Counter(bisect.bisect_left(PRICE_BUCKET_EDGES, row["price"]) for row in rows)
+        return [
+            {"label": _bucket_label(i), "count": counts.get(i, 0)}
+            for i in range(len(PRICE_BUCKET_EDGES) + 1)
+        ]
+
+    def matching(
+        self,
+        product_ids: Iterable[Any],
+        category: Optional[str] = None,
+        brand: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> List[Any]:
+        """The given ids whose rows pass the listing filters, evaluated in memory like the Mongo query would"""
+        category_slug = slugify(category) if category else None
+        brand_pattern = _pattern(brand)
+
+        matches = []
+        for product_id in product_ids:
+            row = self.rows.get(product_id)
+            if row is None:
+                continue
+            if category_slug is not None and category_slug not in row["category_path"]:
+                continue
+            if brand_pattern is not None and not brand_pattern.search(row["brand"]):
+                continue
+            if (min_price is not None and row["price"] < min_price) or (max_price is not None and row["price"] > max_price):
+                continue
+            matches.append(product_id)
+        return matches
+
+    def sorted_page(
+        self,
+        product_ids: Iterable[Any],
+        field: str,
+        direction: int,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[Any, Any]] = None
+    ) -> Tuple[List[Tuple[Any, Any]], int]:
+        """Order ids by a sort field, ``_id`` breaking ties, like the listing's keyset sort.
+
+        Returns a page of (id, sort value) pairs and the total. ``after`` (a
+        (sort value, id) pair from a previous page) starts the page just past
+        that position instead of at ``offset``.
+        """
+        if field not in SORT_FIELDS:
+            raise ValueError(f"Unsupported sort field: {field}")
+        keyed = sorted(
+            ((self.rows[pid][field], str(pid)), pid) for pid in product_ids if pid in self.rows
+        )
+        if direction < 0:
+            keyed.reverse()
+        if after is not None:
+            position = (after[0], str(after[1]))
+            offset = next(
+                (i for i, (key, _) in enumerate(keyed) if (key > position if direction > 0 else key < position)),
+                len(keyed)
+            )
+        end = offset + limit if limit else None
+        return [(pid, key[0]) for key, pid in keyed[offset:end]], len(keyed)
+
+    def counts(
+        self,
+        category: Optional[str] = None,
+        brand: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        product_ids: Optional[Iterable[Any]] = None,
+        cache_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Per-facet counts under the current filters.
+
+        Each facet is counted with every filter applied except its own, so the
+        UI can show how many results picking another value would give.
+        ``product_ids`` restricts the counts to a candidate set (e.g. search hits);
+        ``cache_key`` identifies that set for memoization.
+        """
+        key = (category, brand, min_price, max_price, cache_key)
+        if product_ids is None or cache_key is not None:
+            cached = self._count_cache.get(key)
+            if cached is not None:
+                self._count_cache.move_to_end(key)
+                return cached
+
+        category_slug = slugify(category) if category else None
+        brand_pattern = _pattern(brand)
+
+        if product_ids is None:
+            rows: Iterable[Dict[str, Any]] = self.rows.values()
+        else:
+            rows = [self.rows[pid] for pid in product_ids if pid in self.rows]
+
+        category_counts: Counter = Counter()
+        brand_counts: Counter = Counter()
+        bucket_rows = []
+        total = 0
+
+        for row in rows:
+            in_category = category_slug is None or category_slug in row["category_path"]
+            in_brand = brand_pattern is None or bool(brand_pattern.search(row["brand"]))
+            in_price = (min_price is None or row["price"] >= min_price) and (max_price is None or row["price"] <= max_price)
+
+            if in_brand and in_price:
+                if row["category"]:
+                    category_counts[row["category"]] += 1
+            if in_category and in_price and row["brand"]:
+                brand_counts[row["brand"]] += 1
+            if in_category and in_brand:
+                bucket_rows.append(row)
+                if in_price:
+                    total += 1
+
+        result = {
+            "total": total,
+            "categories": [{"value": v, "count": c} for v, c in category_counts.most_common()],
+            "brands": [{"value": v, "count": c} for v, c in brand_counts.most_common()],
+            "price_buckets": self._histogram(bucket_rows)
+        }
+
+        if product_ids is None or cache_key is not None:
+            self._count_cache[key] = result
+            while len(self._count_cache) > FACET_COUNT_CACHE_SIZE:
+                self._count_cache.popitem(last=False)
+
+        return result
+
+
+# Instantiate global facet index
+facet_index = FacetIndex()
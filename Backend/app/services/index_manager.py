@@ -0,0 +1,176 @@
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+
+class IndexSpec:
+    """One index the application's queries rely on"""
+
+    def __init__(self, collection: str, keys: List[Tuple[str, Any]], used_by: str, **options):
+        self.collection = collection
+        self.keys = keys
+        self.used_by = used_by
+        self.options = options
+        self.name = options.get("name") or "_".join(f"{field}_{direction}" for field, direction in keys)
+
+    @property
+    def is_text(self) -> bool:
+        return any(direction == "text" for _, direction in self.keys)
+
+    def matches(self, info: Dict[str, Any], name: str) -> bool:
+        # Text indexes are stored as _fts/_ftsx keys, so compare them by name
+        if self.is_text:
+            return name == self.name
+        return [tuple(k) for k in info["key"]] == [tuple(k) for k in self.keys]
+
+    def model(self) -> IndexModel:
+        return IndexModel(self.keys, name=self.name, **self.options)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "collection": self.collection,
+            "name": self.name,
+            "keys": [list(k) for k in self.keys],
+            "options": self.options,
+            "used_by": self.used_by
+        }
+
+
+# Indexes declared from the query shapes in the routers and services
+INDEX_SPECS: List[IndexSpec] = [
+    IndexSpec("users", [("email", 1)], "auth: login, get_current_user", unique=True),
+    IndexSpec("users", [("username", 1)], "auth: signup duplicate check", unique=True),
+
+    IndexSpec("products", [("brand", 1)], "products: brand filter"),
+    IndexSpec("products", [("price", 1)], "products: price range filter"),
+    IndexSpec("products", [("rating", 1)], "products: rating sort"),
+    IndexSpec("products", [("name", 1), ("_id", 1)], "products: sort_by=name with keyset pagination"),
+    IndexSpec("products", [("price", 1), ("_id", 1)], "products: sort_by=price with keyset pagination"),
+    IndexSpec("products", [("rating", 1), ("_id", 1)], "products: sort_by=rating with keyset pagination"),
+    IndexSpec("products", [("category_path", 1)], "products: taxonomy category filter"),
+
+    IndexSpec("carts", [("user_id", 1)], "cart: one cart document per user, atomic upserts", unique=True),
+
+    IndexSpec("inventory_shards", [("product_id", 1)], "inventory: counter seeding and available-stock rollup"),
+    IndexSpec("inventory_reservations", [("status", 1), ("expires_at", 1)], "inventory: expired reservation sweep"),
+    IndexSpec("inventory_reservations", [("holds_open", 1)], "inventory: committed reservations with shard holds to clear", sparse=True),
+
+    IndexSpec("purchases", [("user_id", 1), ("order_date", -1), ("_id", -1)], "purchases/cart: keyset-paged order history"),
+
+    IndexSpec("purchase_stats", [("user_id", 1), ("purchase_count", -1), ("_id", 1)], "purchases: most-bought products per user"),
+    IndexSpec("purchase_stats", [("user_id", 1), ("last_purchase_at", -1), ("_id", 1)], "purchases: recently bought products per user"),
+
+    IndexSpec("chat_messages", [("user_id", 1), ("timestamp", -1), ("_id", -1)], "chatbot: paginated history, retention cap"),
+
+    IndexSpec("chat_messages", [("expires_at", 1)], "chatbot: CHAT_HISTORY_TTL_DAYS expiry", expireAfterSeconds=0),
+]
+
+
+class IndexManager:
+    """Reconciles the declared indexes with the ones that exist in MongoDB"""
+
+    def __init__(self, specs: List[IndexSpec] = None):
+        self.specs = specs if specs is not None else INDEX_SPECS
+        self.status = "pending"
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def _collections(self) -> List[str]:
+        return sorted({spec.collection for spec in self.specs})
+
+    async def diff(self, db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+        """Compare declared indexes with existing ones without changing anything"""
+        missing: List[IndexSpec] = []
+        present: List[Dict[str, Any]] = []
+        undeclared: List[Dict[str, Any]] = []
+
+        for collection in self._collections():
+            existing = await db[collection].index_information()
+            specs = [spec for spec in self.specs if spec.collection == collection]
+            matched_names = set()
+
+            for spec in specs:
+                match = next((name for name, info in existing.items() if spec.matches(info, name)), None)
+                if match is None:
+                    missing.append(spec)
+                else:
+                    matched_names.add(match)
+                    present.append({**spec.describe(), "existing_name": match})
+
+            for name, info in existing.items():
+                if name == "_id_" or name in matched_names:
+                    continue
+                undeclared.append({"collection": collection, "name": name, "keys": [list(k) for k in info["key"]]})
+
+        return {"missing": missing, "present": present, "undeclared": undeclared}
+
+    async def _usage(self, db: AsyncIOMotorDatabase, collection: str) -> Dict[str, int]:
+        """Operation counts per index since server start ($indexStats)"""
+        usage = {}
+        try:
+            async for stat in db[collection].aggregate([{"$indexStats": {}}]):
+                usage[stat["name"]] = stat.get("accesses", {}).get("ops", 0)
+        except OperationFailure:
+            pass
+        return usage
+
+    async def reconcile(self, db: AsyncIOMotorDatabase, build: bool = True) -> Dict[str, Any]:
+        """Build missing indexes and report declared, undeclared and unused ones.
+
+        Meant to run as a background task so index builds never hold up startup.
+        """
+        started = time.perf_counter()
+        self.status = "building" if build else "checking"
+        try:
+            result = await self.diff(db)
+
+            created, failed = [], []
+            if build:
+                for spec in result["missing"]:
+                    try:
+                        await db[spec.collection].create_indexes([spec.model()])
+                        created.append(spec.describe())
+                    except OperationFailure as e:
+                        failed.append({**spec.describe(), "error": str(e)})
+
+            usage = {}
+            for collection in self._collections():
+                for name, ops in (await self._usage(db, collection)).items():
+                    usage[(collection, name)] = ops
+
+            unused = [
+                {"collection": entry["collection"], "name": entry["existing_name"], "used_by": entry["used_by"]}
+                for entry in result["present"]
+                if usage.get((entry["collection"], entry["existing_name"])) == 0
+            ]
+            for entry in result["undeclared"]:
+                entry["ops"] = usage.get((entry["collection"], entry["name"]))
+
+            self.last_report = {
+                "checked_at": datetime.utcnow(),
+                "elapsed_seconds": round(time.perf_counter() - started, 3),
+                "declared": len(self.specs),
+                "present": len(result["present"]),
+                "missing": [] if build else [spec.describe() for spec in result["missing"]],
+                "created": created,
+                "failed": failed,
+                "undeclared": result["undeclared"],
+                "unused": unused
+            }
+            self.status = "error" if failed else "ready"
+            print(
+                f"Index reconcile: {len(created)} created, {len(failed)} failed, "
+                f"{len(result['undeclared'])} undeclared, {len(unused)} unused"
+            )
+        except Exception as e:
+            self.status = "error"
+            self.last_report = {"checked_at": datetime.utcnow(), "error": str(e)}
+            print(f"Error reconciling indexes: {e}")
+
+        return self.last_report
+
+
+# Instantiate global index manager
+index_manager = IndexManager()
@@ -0,0 +1,385 @@
+import os
+import random
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Set
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.services.product_cache import product_cache, product_id_candidates
+
+# Stock of each product is split across this many counter documents so
+# concurrent checkouts of one hot SKU do not all update the same document
+INVENTORY_SHARDS = int(os.getenv("INVENTORY_SHARDS", "4"))
+# Held reservations not committed within this many seconds are released
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+# How often the sweeper releases expired reservations and rolls stock up onto products
+INVENTORY_SWEEP_INTERVAL = float(os.getenv("INVENTORY_SWEEP_INTERVAL", "30"))
+
+# Passes over the shards a take makes while contention, not a lack of stock, leaves it short
+TAKE_MAX_PASSES = 3
+
+HELD = "held"
+COMMITTED = "committed"
+RELEASED = "released"
+
+
+class InsufficientStockError(ValueError):
+    """Raised when a reservation cannot be filled"""
+
+    def __init__(self, product_id: str, requested: int, available: int):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Insufficient stock for product {product_id}: requested {requested}, available {available}")
+
+
+def _shard_id(product_id: str, shard: int) -> str:
+    return f"{product_id}:{shard}"
+
+
+class InventoryManager:
+    """Reserves stock with conditional $inc updates on sharded counters.
+
+    ``inventory_shards`` holds one document per (product, shard) with an
+    ``available`` count, seeded lazily from the product's stock_quantity.
+    A decrement only matches while ``available`` covers it, so stock never
+    goes negative. Each decrement pushes a hold tagged with the reservation
+    id onto the same shard document, so a take and its record cannot be
+    separated by a crash; releasing a reservation gives its holds back.
+    Shard 0 also keeps ``feed_stock``, the catalog stock the counters were
+    last set from, so feed changes are applied as deltas.
+    """
+
+    def __init__(self, shards: int = INVENTORY_SHARDS, ttl_seconds: int = RESERVATION_TTL_SECONDS):
+        self.shards = max(1, shards)
+        self.ttl_seconds = ttl_seconds
+        # Products whose counters exist, and ones whose stock changed since the last rollup
+        self._seeded: Set[str] = set()
+        self._dirty: Set[str] = set()
+
+    def _split(self, quantity: int) -> List[int]:
+        """Even split across the shards, remainder on the first ones"""
+        return [quantity // self.shards + (1 if shard < quantity % self.shards else 0) for shard in range(self.shards)]
+
+    async def ensure_counters(self, db: AsyncIOMotorDatabase, product_ids: Iterable[str]):
+        """Create counter shards for products that have none yet (idempotent)"""
+        pending = [product_id for product_id in set(product_ids) if product_id not in self._seeded]
+        if not pending:
+            return
+
+        existing = set(await db.inventory_shards.distinct("product_id", {"product_id": {"$in": pending}}))
+        missing = [product_id for product_id in pending if product_id not in existing]
+        # Only ids that end up with counters are remembered; an id with no product
+        # yet is looked up again, so a product created later still gets seeded
+        seeded = existing
+
+        if missing:
+            lookup_values: List[Any] = []
+            for product_id in missing:
+                lookup_values.extend(product_id_candidates(product_id))
+
+            operations = []
+            async for product in db.products.find({"_id": {"$in": lookup_values}}, {"stock_quantity": 1}):
+                product_id = str(product["_id"])
+                seeded.add(product_id)
+                stock = max(0, int(product.get("stock_quantity") or 0))
+                for shard, available in enumerate(self._split(stock)):
+                    fields = {"product_id": product_id, "shard": shard, "available": available, "holds": []}
+                    if shard == 0:
+                        fields["feed_stock"] = stock
+                    operations.append(UpdateOne(
+                        {"_id": _shard_id(product_id, shard)},
+                        {"$setOnInsert": fields},
+                        upsert=True
+                    ))
+            if operations:
+                await db.inventory_shards.bulk_write(operations, ordered=False)
+
+        self._seeded.update(seeded)
+
+    async def available(self, db: AsyncIOMotorDatabase, product_ids: Iterable[str]) -> Dict[str, int]:
+        """Current available stock per product, summed over its shards"""
+        product_ids = list(product_ids)
+        await self.ensure_counters(db, product_ids)
+        totals = {product_id: 0 for product_id in product_ids}
+        pipeline = [
+            {"$match": {"product_id": {"$in": product_ids}}},
+            {"$group": {"_id": "$product_id", "available": {"$sum": "$available"}}}
+        ]
+        async for row in db.inventory_shards.aggregate(pipeline):
+            totals[row["_id"]] = row["available"]
+        return totals
+
+    async def _take(self, db: AsyncIOMotorDatabase, reservation_id: ObjectId, product_id: str, quantity: int) -> int:
+        """Take up to ``quantity`` from the product's shards; returns the amount taken.
+
+        Shards are visited in random order so concurrent checkouts spread
+        their writes. A conditional update that loses a race to another
+        checkout does not mean the product is out of stock, so further passes
+        are made while the shards together still cover what is missing.
+        """
+        remaining = quantity
+
+        for _ in range(TAKE_MAX_PASSES):
+            order = list(range(self.shards))
+            random.shuffle(order)
+
+            for shard in order:
+                if remaining <= 0:
+                    break
+                shard_id = _shard_id(product_id, shard)
+
+                # Fast path: the whole remainder fits in this shard
+                taken = remaining if await self._take_from_shard(db, reservation_id, shard_id, remaining) else 0
+
+                if not taken:
+                    # Drain what is left in this shard instead
+                    current = await db.inventory_shards.find_one({"_id": shard_id}, {"available": 1})
+                    partial = min(remaining, (current or {}).get("available", 0))
+                    if partial > 0 and await self._take_from_shard(db, reservation_id, shard_id, partial):
+                        taken = partial
+
+                if taken:
+                    await db.inventory_reservations.update_one(
+                        {"_id": reservation_id},
+                        {"$push": {"lines": {"product_id": product_id, "shard": shard, "quantity": taken}}}
+                    )
+                    remaining -= taken
+
+            if remaining <= 0:
+                break
+            if (await self.available(db, [product_id]))[product_id] < remaining:
+                break
+
+        return quantity - remaining
+
+    async def _take_from_shard(self, db: AsyncIOMotorDatabase, reservation_id: ObjectId, shard_id: str, quantity: int) -> bool:
+        """Decrement one shard and record the hold in the same single-document update"""
+        result = await db.inventory_shards.update_one(
+            {"_id": shard_id, "available": {"$gte": quantity}},
+            {
+                "$inc": {"available": -quantity},
+                "$push": {"holds": {"reservation": reservation_id, "quantity": quantity}}
+            }
+        )
+        return result.modified_count > 0
+
+    async def reserve(self, db: AsyncIOMotorDatabase, user_id: str, quantities: Dict[str, int]) -> ObjectId:
+        """Hold stock for every product in ``quantities`` or for none of them.
+
+        Returns the reservation id. Raises InsufficientStockError, after giving
+        back anything already taken, when a product cannot be filled.
+        """
+        await self.ensure_counters(db, quantities.keys())
+
+        now = datetime.utcnow()
+        result = await db.inventory_reservations.insert_one({
+            "user_id": user_id,
+            "status": HELD,
+            "products": [product_id for product_id, quantity in quantities.items() if quantity > 0],
+            "lines": [],
+            "holds_open": True,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl_seconds)
+        })
+        reservation_id = result.inserted_id
+
+        for product_id, quantity in quantities.items():
+            if quantity <= 0:
+                continue
+            taken = await self._take(db, reservation_id, product_id, quantity)
+            self._dirty.add(product_id)
+            if taken < quantity:
+                await self.release(db, reservation_id)
+                available = (await self.available(db, [product_id]))[product_id]
+                raise InsufficientStockError(product_id, quantity, available)
+
+        return reservation_id
+
+    async def commit(self, db: AsyncIOMotorDatabase, reservation_id: ObjectId, session=None) -> bool:
+        """Turn a held reservation into a sale; False if it already expired or was released"""
+        result = await db.inventory_reservations.update_one(
+            {"_id": reservation_id, "status": HELD},
+            {"$set": {"status": COMMITTED, "committed_at": datetime.utcnow()}, "$unset": {"expires_at": ""}},
+            session=session
+        )
+        return result.modified_count > 0
+
+    async def release(self, db: AsyncIOMotorDatabase, reservation_id: ObjectId, include_committed: bool = False) -> bool:
+        """Give a held reservation's stock back to its shards.
+
+        ``include_committed`` also undoes a commit, for checkouts that have to
+        be rolled back by hand when no transaction is available.
+        """
+        statuses = [HELD, COMMITTED] if include_committed else [HELD]
+        # Flip the status first so a reservation is only ever released once
+        reservation = await db.inventory_reservations.find_one_and_update(
+            {"_id": reservation_id, "status": {"$in": statuses}},
+            {
+                "$set": {"status": RELEASED, "released_at": datetime.utcnow()},
+                "$unset": {"expires_at": "", "holds_open": ""}
+            },
+            return_document=ReturnDocument.BEFORE
+        )
+        if not reservation:
+            return False
+
+        if reservation.get("holds_open"):
+            # Return exactly what the shards recorded, including takes the
+            # reservation's lines missed because the process died mid-checkout
+            products = reservation.get("products") or [line["product_id"] for line in reservation.get("lines", [])]
+            await db.inventory_shards.update_many(
+                {"product_id": {"$in": products}, "holds.reservation": reservation_id},
+                [{"$set": {
+                    "available": {"$add": ["$available", {"$sum": {"$map": {
+                        "input": {"$filter": {"input": "$holds", "cond": {"$eq": ["$$this.reservation", reservation_id]}}},
+                        "in": "$$this.quantity"
+                    }}}]},
+                    "holds": {"$filter": {"input": "$holds", "cond": {"$ne": ["$$this.reservation", reservation_id]}}}
+                }}]
+            )
+            self._dirty.update(products)
+        else:
+            # A committed sale whose holds were already cleared: its lines are complete
+            operations = [
+                UpdateOne({"_id": _shard_id(line["product_id"], line["shard"])}, {"$inc": {"available": line["quantity"]}})
+                for line in reservation.get("lines", [])
+            ]
+            if operations:
+                await db.inventory_shards.bulk_write(operations, ordered=False)
+                self._dirty.update(line["product_id"] for line in reservation["lines"])
+        return True
+
+    async def clear_committed_holds(self, db: AsyncIOMotorDatabase) -> int:
+        """Drop the shard holds of committed reservations; the stock stays sold"""
+        cleared = 0
+        cursor = db.inventory_reservations.find({"holds_open": True, "status": COMMITTED}, {"products": 1})
+        async for reservation in cursor:
+            # Close the reservation first, so a concurrent manual release falls back to its lines
+            result = await db.inventory_reservations.update_one(
+                {"_id": reservation["_id"], "status": COMMITTED, "holds_open": True},
+                {"$unset": {"holds_open": ""}}
+            )
+            if not result.modified_count:
+                continue
+            await db.inventory_shards.update_many(
+                {"product_id": {"$in": reservation.get("products", [])}, "holds.reservation": reservation["_id"]},
+                {"$pull": {"holds": {"reservation": reservation["_id"]}}}
+            )
+            cleared += 1
+        return cleared
+
+    async def apply_feed_stock(self, db: AsyncIOMotorDatabase, stocks: Dict[str, int]) -> int:
+        """Carry catalog stock_quantity changes onto products that already have counters.
+
+        The difference to the feed value the counters were last set from is
+        added to the shards, or taken from them down to zero, so units held or
+        sold since are not handed out again. Products without counters are
+        left alone; they are seeded from the new value on first use.
+        """
+        if not stocks:
+            return 0
+
+        baselines: Dict[str, Any] = {}
+        cursor = db.inventory_shards.find(
+            {"_id": {"$in": [_shard_id(product_id, 0) for product_id in stocks]}},
+            {"product_id": 1, "feed_stock": 1}
+        )
+        async for counter in cursor:
+            baselines[counter["product_id"]] = counter.get("feed_stock")
+
+        adjusted = 0
+        for product_id, baseline in baselines.items():
+            stock = max(0, int(stocks[product_id] or 0))
+            shard_zero = _shard_id(product_id, 0)
+            if baseline is None:
+                # Seeded before feed tracking: start tracking from this value
+                await db.inventory_shards.update_one(
+                    {"_id": shard_zero, "feed_stock": {"$exists": False}},
+                    {"$set": {"feed_stock": stock}}
+                )
+                continue
+            delta = stock - baseline
+            if delta == 0:
+                continue
+
+            # Claim the change before applying it, so two syncs never apply one delta twice
+            result = await db.inventory_shards.update_one(
+                {"_id": shard_zero, "feed_stock": baseline},
+                {"$set": {"feed_stock": stock}}
+            )
+            if not result.modified_count:
+                continue
+
+            if delta > 0:
+                await db.inventory_shards.bulk_write([
+                    UpdateOne({"_id": _shard_id(product_id, shard)}, {"$inc": {"available": amount}})
+                    for shard, amount in enumerate(self._split(delta)) if amount
+                ], ordered=False)
+            else:
+                remaining = -delta
+                for shard in range(self.shards):
+                    if remaining <= 0:
+                        break
+                    before = await db.inventory_shards.find_one_and_update(
+                        {"_id": _shard_id(product_id, shard)},
+                        [{"$set": {"available": {"$max": [{"$subtract": ["$available", remaining]}, 0]}}}],
+                        projection={"available": 1},
+                        return_document=ReturnDocument.BEFORE
+                    )
+                    remaining -= min(remaining, (before or {}).get("available", 0))
+
+            self._dirty.add(product_id)
+            adjusted += 1
+
+        if adjusted:
+            print(f"Applied catalog stock changes to {adjusted} products' inventory counters")
+        return adjusted
+
+    async def release_expired(self, db: AsyncIOMotorDatabase) -> int:
+        released = 0
+        cursor = db.inventory_reservations.find(
+            {"status": HELD, "expires_at": {"$lt": datetime.utcnow()}}, {"_id": 1}
+        )
+        async for reservation in cursor:
+            if await self.release(db, reservation["_id"]):
+                released += 1
+        if released:
+            print(f"Released {released} expired inventory reservations")
+        return released
+
+    async def rollup(self, db: AsyncIOMotorDatabase) -> int:
+        """Copy summed shard stock onto products.stock_quantity for display"""
+        dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return 0
+
+        totals = await self.available(db, dirty)
+        operations = []
+        for product_id, available in totals.items():
+            operations.append(UpdateOne(
+                {"_id": {"$in": product_id_candidates(product_id)}},
+                {"$set": {"stock_quantity": available}}
+            ))
+        await db.products.bulk_write(operations, ordered=False)
+        product_cache.invalidate_many(dirty)
+        return len(operations)
+
+    async def run_sweeper(self, db: AsyncIOMotorDatabase, interval: float = INVENTORY_SWEEP_INTERVAL):
+        """Background loop: release expired reservations, clear sold holds and roll stock up onto products"""
+        while True:
+            try:
+                await self.release_expired(db)
+                await self.clear_committed_holds(db)
+                await self.rollup(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in inventory sweeper: {e}")
+            await asyncio.sleep(interval)
+
+
+# Instantiate global inventory manager
+inventory_manager = InventoryManager()
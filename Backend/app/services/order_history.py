@@ -0,0 +1,140 @@
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.services.pagination import keyset_filter, keyset_sort, split_page
+
+# Slim order summary: no item arrays or shipping addresses, just the line count
+SUMMARY_PROJECTION = {
+    "user_id": 1,
+    "total_amount": 1,
+    "payment_method": 1,
+    "status": 1,
+    "order_date": 1,
+    "estimated_delivery": 1,
+    "items_count": {"$size": {"$ifNull": ["$items", []]}}
+}
+
+BACKFILL_BATCH_SIZE = 500
+# Tries at storing a lazily counted order_count while orders keep landing
+COUNT_ATTEMPTS = 3
+
+
+def _user_key(user_id: str):
+    try:
+        return ObjectId(user_id)
+    except Exception:
+        return user_id
+
+
+class OrderHistory:
+    """Keyset-paged purchase history on (user_id, order_date, _id) and a per-user order counter.
+
+    The counter lives on the user document as ``order_count`` and is bumped in
+    the same write as the purchase, so totals never need a count_documents.
+    """
+
+    async def record_order(self, db: AsyncIOMotorDatabase, user_id: str, session=None, increment: int = 1):
+        """Count one new order for the user (call alongside the purchase insert).
+
+        Users without a counter yet only get ``orders_recorded`` bumped;
+        order_count() or the backfill derives theirs from purchases, and that
+        field tells them an order landed while they were counting.
+        """
+        await db.users.update_one(
+            {"_id": _user_key(user_id)},
+            [{"$set": {
+                "order_count": {"$cond": [
+                    {"$eq": [{"$type": "$order_count"}, "missing"]},
+                    "$$REMOVE",
+                    {"$add": ["$order_count", increment]}
+                ]},
+                "orders_recorded": {"$add": [{"$ifNull": ["$orders_recorded", 0]}, increment]}
+            }}],
+            session=session
+        )
+
+    def _unchanged_since(self, user_key, recorded: Optional[int]) -> Dict[str, Any]:
+        """Filter for a user with no counter yet and no order recorded since ``recorded`` was read"""
+        return {
+            "_id": user_key,
+            "order_count": {"$exists": False},
+            "orders_recorded": recorded if recorded is not None else {"$exists": False}
+        }
+
+    async def order_count(self, db: AsyncIOMotorDatabase, user_id: str) -> int:
+        user_key = _user_key(user_id)
+        for _ in range(COUNT_ATTEMPTS):
+            user = await db.users.find_one({"_id": user_key}, {"order_count": 1, "orders_recorded": 1})
+            if user is None:
+                return await db.purchases.count_documents({"user_id": user_id})
+            if "order_count" in user:
+                return user["order_count"]
+
+            # Not backfilled yet: count once and store it, unless an order was
+            # recorded meanwhile and the count may already be stale
+            count = await db.purchases.count_documents({"user_id": user_id})
+            result = await db.users.update_one(
+                self._unchanged_since(user_key, user.get("orders_recorded")),
+                {"$set": {"order_count": count}}
+            )
+            if result.modified_count:
+                return count
+        return await db.purchases.count_documents({"user_id": user_id})
+
+    async def page(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        summary: bool = False
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of orders, newest first, plus the cursor for the next page.
+
+        Raises ValueError for a malformed cursor.
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        if cursor:
+            query = keyset_filter(query, "order_date", -1, cursor)
+
+        projection = SUMMARY_PROJECTION if summary else None
+        documents = await db.purchases.find(query, projection).sort(
+            keyset_sort("order_date", -1)
+        ).limit(limit + 1).to_list(limit + 1)
+        return split_page(documents, "order_date", limit)
+
+    async def backfill_counts(self, db: AsyncIOMotorDatabase) -> int:
+        """Set order_count on users that do not have one yet from their purchases.
+
+        Users who place an order while this runs are skipped and counted
+        lazily by order_count() instead.
+        """
+        # Read before counting, so an order landing in between shows up as a mismatch
+        recorded: Dict[Any, Optional[int]] = {}
+        async for user in db.users.find({"order_count": {"$exists": False}}, {"orders_recorded": 1}):
+            recorded[user["_id"]] = user.get("orders_recorded")
+
+        operations = []
+        updated = 0
+        async for row in db.purchases.aggregate([{"$group": {"_id": "$user_id", "count": {"$sum": 1}}}]):
+            user_key = _user_key(row["_id"])
+            if user_key not in recorded:
+                continue
+            operations.append(UpdateOne(
+                self._unchanged_since(user_key, recorded[user_key]),
+                {"$set": {"order_count": row["count"]}}
+            ))
+            if len(operations) >= BACKFILL_BATCH_SIZE:
+                updated += (await db.users.bulk_write(operations, ordered=False)).modified_count
+                operations = []
+        if operations:
+            updated += (await db.users.bulk_write(operations, ordered=False)).modified_count
+        if updated:
+            print(f"Backfilled order counts for {updated} users")
+        return updated
+
+
+# Instantiate global order history
+order_history = OrderHistory()
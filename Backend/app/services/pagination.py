@@ -0,0 +1,72 @@
+import base64
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from bson import json_util
+
+# Server-side bounds on page size
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "24"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+
+
+def clamp_limit(limit: Optional[int], default: Optional[int] = None) -> Optional[int]:
+    """Apply the server-side maximum to a requested page size"""
+    if limit is None:
+        limit = default
+    if limit is None:
+        return None
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(sort_value: Any, doc_id: Any) -> str:
+    """Build an opaque cursor from the sort key of the last document on a page"""
+    raw = json_util.dumps([sort_value, doc_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    """Inverse of encode_cursor. Raises ValueError on malformed input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, doc_id = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return sort_value, doc_id
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def keyset_sort(sort_field: str, direction: int) -> List[Tuple[str, int]]:
+    """Sort spec with _id as tiebreaker so every position is unique"""
+    if sort_field == "_id":
+        return [("_id", direction)]
+    return [(sort_field, direction), ("_id", direction)]
+
+
+def keyset_filter(filter_query: Dict[str, Any], sort_field: str, direction: int, cursor: str) -> Dict[str, Any]:
+    """Restrict a query to documents after the cursor position in (sort_field, _id) order"""
+    sort_value, doc_id = decode_cursor(cursor)
+    op = "$gt" if direction == 1 else "$lt"
+
+    if sort_field == "_id":
+        after = {"_id": {op: doc_id}}
+    else:
+        after = {
+            "$or": [
+                {sort_field: {op: sort_value}},
+                {sort_field: sort_value, "_id": {op: doc_id}}
+            ]
+        }
+
+    if not filter_query:
+        return after
+    return {"$and": [filter_query, after]}
+
+
+def split_page(documents: List[Dict[str, Any]], sort_field: str, limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Trim a ``limit + 1`` fetch to one page and build the cursor for the next one.
+
+    Returns the page and the next cursor, or None when this was the last page.
+    """
+    if len(documents) <= limit:
+        return documents, None
+    page = documents[:limit]
+    last = page[-1]
+    return page, encode_cursor(last.get(sort_field), last["_id"])
@@ -0,0 +1,140 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+# Cache configuration
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "5000"))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "300"))
+PRODUCT_CACHE_NEGATIVE_TTL = float(os.getenv("PRODUCT_CACHE_NEGATIVE_TTL", "30"))
+
+# Marker stored for ids known not to exist
+_MISSING = object()
+
+
+def product_id_candidates(product_id: str) -> List[Any]:
+    """All _id values a client-supplied product id may refer to.
+
+    CSV products use the string product_id as _id, other documents use ObjectId.
+    """
+    candidates: List[Any] = [product_id]
+    if ObjectId.is_valid(product_id):
+        candidates.append(ObjectId(product_id))
+    return candidates
+
+
+class ProductCache:
+    """Process-local read-through cache of product documents with LRU eviction and TTL"""
+
+    def __init__(
+        self,
+        max_size: int = PRODUCT_CACHE_SIZE,
+        ttl: float = PRODUCT_CACHE_TTL,
+        negative_ttl: float = PRODUCT_CACHE_NEGATIVE_TTL
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # product id (str) -> (expires_at, product document or _MISSING)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key: str):
+        """Return the cached value for key, or None when absent or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: str, value: Any):
+        ttl = self.negative_ttl if value is _MISSING else self.ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, product: Dict[str, Any]):
+        """Seed the cache with a document that was just read or written"""
+        # Soft-deleted products resolve as missing everywhere
+        self._store(str(product["_id"]), _MISSING if product.get("deleted") else product)
+
+    async def get(self, db: AsyncIOMotorDatabase, product_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a product by id, from cache when possible. Soft-deleted products count as missing."""
+        cached = self._lookup(product_id)
+        if cached is not None:
+            self.hits += 1
+            return None if cached is _MISSING else cached
+
+        self.misses += 1
+        product = await db.products.find_one({"_id": {"$in": product_id_candidates(product_id)}, "deleted": {"$ne": True}})
+        self._store(product_id, product if product else _MISSING)
+        return product
+
+    async def get_many(self, db: AsyncIOMotorDatabase, product_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Resolve many ids with at most one query. Unknown ids map to None."""
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        pending: List[str] = []
+
+        for product_id in product_ids:
+            if product_id in results:
+                continue
+            cached = self._lookup(product_id)
+            if cached is None:
+                self.misses += 1
+                results[product_id] = None
+                pending.append(product_id)
+            else:
+                self.hits += 1
+                results[product_id] = None if cached is _MISSING else cached
+
+        if pending:
+            lookup_values: List[Any] = []
+            for product_id in pending:
+                lookup_values.extend(product_id_candidates(product_id))
+
+            async for product in db.products.find({"_id": {"$in": lookup_values}, "deleted": {"$ne": True}}):
+                key = str(product["_id"])
+                if key in results:
+                    results[key] = product
+
+            for product_id in pending:
+                self._store(product_id, results[product_id] or _MISSING)
+
+        return results
+
+    def invalidate(self, product_id: Any):
+        """Forget a single product after it was written"""
+        self._entries.pop(str(product_id), None)
+
+    def invalidate_many(self, product_ids: Iterable[Any]):
+        for product_id in product_ids:
+            self.invalidate(product_id)
+
+    def clear(self):
+        """Forget everything, e.g. after a catalog reload"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+# Instantiate global product cache
+product_cache = ProductCache()
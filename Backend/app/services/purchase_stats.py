@@ -0,0 +1,148 @@
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from pymongo import UpdateOne
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+MS_PER_DAY = 86400000
+
+
+def _stat_id(user_id: str, product_id: str) -> str:
+    return f"{user_id}:{product_id}"
+
+
+def _public(stat: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "product_id": stat["product_id"],
+        "purchase_count": stat.get("purchase_count", 0),
+        "total_quantity": stat.get("total_quantity", 0),
+        "first_purchase_at": stat.get("first_purchase_at"),
+        "last_purchase_at": stat.get("last_purchase_at"),
+        "mean_interval_days": stat.get("mean_interval_days")
+    }
+
+
+# Derived from the running fields, so increments and the backfill agree
+MEAN_INTERVAL_STAGE = {
+    "$set": {
+        "mean_interval_days": {
+            "$cond": [
+                {"$gt": ["$purchase_count", 1]},
+                {"$divide": [
+                    {"$subtract": ["$last_purchase_at", "$first_purchase_at"]},
+                    {"$multiply": [{"$subtract": ["$purchase_count", 1]}, MS_PER_DAY]}
+                ]},
+                None
+            ]
+        }
+    }
+}
+
+
+class PurchaseStats:
+    """Materialized per-user, per-product purchase aggregates in ``purchase_stats``.
+
+    One document per (user, product) with purchase count, total quantity,
+    first/last purchase date and mean repurchase interval in days. Checkout
+    updates it incrementally; ``rebuild`` recomputes it from ``purchases``.
+    """
+
+    def record_operations(self, user_id: str, items: Iterable[Dict[str, Any]], order_date: datetime) -> List[UpdateOne]:
+        """Upserts counting one order's lines (each product once per order)"""
+        quantities: Dict[str, int] = {}
+        for item in items:
+            product_id = str(item["product_id"])
+            quantities[product_id] = quantities.get(product_id, 0) + item.get("quantity", 0)
+
+        operations = []
+        for product_id, quantity in quantities.items():
+            operations.append(UpdateOne(
+                {"_id": _stat_id(user_id, product_id)},
+                [
+                    {"$set": {
+                        "user_id": {"$literal": user_id},
+                        "product_id": {"$literal": product_id},
+                        "purchase_count": {"$add": [{"$ifNull": ["$purchase_count", 0]}, 1]},
+                        "total_quantity": {"$add": [{"$ifNull": ["$total_quantity", 0]}, quantity]},
+                        "first_purchase_at": {"$min": [{"$ifNull": ["$first_purchase_at", order_date]}, order_date]},
+                        "last_purchase_at": {"$max": [{"$ifNull": ["$last_purchase_at", order_date]}, order_date]}
+                    }},
+                    MEAN_INTERVAL_STAGE
+                ],
+                upsert=True
+            ))
+        return operations
+
+    async def record(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        items: Iterable[Dict[str, Any]],
+        order_date: datetime,
+        session=None
+    ):
+        """Fold one order into the user's aggregates (call alongside the purchase insert)"""
+        operations = self.record_operations(user_id, items, order_date)
+        if operations:
+            await db.purchase_stats.bulk_write(operations, ordered=False, session=session)
+
+    async def get(self, db: AsyncIOMotorDatabase, user_id: str, product_id: str) -> Optional[Dict[str, Any]]:
+        stat = await db.purchase_stats.find_one({"_id": _stat_id(user_id, product_id)})
+        return _public(stat) if stat else None
+
+    async def for_user(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        limit: int = 20,
+        sort_by: str = "purchase_count"
+    ) -> List[Dict[str, Any]]:
+        """A user's aggregates, most bought (or most recent) first"""
+        if sort_by not in ("purchase_count", "last_purchase_at"):
+            raise ValueError("sort_by must be 'purchase_count' or 'last_purchase_at'")
+        cursor = db.purchase_stats.find({"user_id": user_id}).sort([(sort_by, -1), ("_id", 1)]).limit(limit)
+        return [_public(stat) async for stat in cursor]
+
+    async def rebuild(self, db: AsyncIOMotorDatabase, user_id: Optional[str] = None) -> int:
+        """Recompute aggregates from ``purchases`` (all users, or one) with a server-side $merge"""
+        started = time.perf_counter()
+        match: Dict[str, Any] = {"user_id": user_id} if user_id else {}
+        pipeline = [
+            {"$match": match},
+            {"$unwind": "$items"},
+            # Collapse repeated lines of one product within an order first
+            {"$group": {
+                "_id": {"order": "$_id", "product_id": {"$toString": "$items.product_id"}},
+                "user_id": {"$first": "$user_id"},
+                "order_date": {"$first": "$order_date"},
+                "quantity": {"$sum": "$items.quantity"}
+            }},
+            {"$group": {
+                "_id": {"$concat": ["$user_id", ":", "$_id.product_id"]},
+                "user_id": {"$first": "$user_id"},
+                "product_id": {"$first": "$_id.product_id"},
+                "purchase_count": {"$sum": 1},
+                "total_quantity": {"$sum": "$quantity"},
+                "first_purchase_at": {"$min": "$order_date"},
+                "last_purchase_at": {"$max": "$order_date"}
+            }},
+            MEAN_INTERVAL_STAGE,
+            {"$merge": {"into": "purchase_stats", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]
+        await db.purchases.aggregate(pipeline).to_list(None)
+
+        count = await db.purchase_stats.count_documents({"user_id": user_id} if user_id else {})
+        print(f"Rebuilt {count} purchase aggregates in {time.perf_counter() - started:.2f}s")
+        return count
+
+    async def backfill(self, db: AsyncIOMotorDatabase) -> int:
+        """Build the aggregates once when purchases exist but none were materialized yet"""
+        if await db.purchase_stats.estimated_document_count() > 0:
+            return 0
+        if not await db.purchases.find_one({}, {"_id": 1}):
+            return 0
+        return await self.rebuild(db)
+
+
+# Instantiate global purchase stats
+purchase_stats = PurchaseStats()
@@ -0,0 +1,287 @@
+import os
+import time
+import socket
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import numpy as np
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+# Prediction window: probability that the user buys the product again within this many days
+REORDER_HORIZON_DAYS = float(os.getenv("REORDER_HORIZON_DAYS", "14"))
+# Assumed repurchase interval for products bought only once
+REORDER_PRIOR_INTERVAL_DAYS = float(os.getenv("REORDER_PRIOR_INTERVAL_DAYS", "30"))
+# Pseudo-count shrinking the confidence of products with few purchases
+REORDER_PRIOR_WEIGHT = float(os.getenv("REORDER_PRIOR_WEIGHT", "2"))
+REORDER_MIN_PROBABILITY = float(os.getenv("REORDER_MIN_PROBABILITY", "0.2"))
+REORDER_TOP_K = int(os.getenv("REORDER_TOP_K", "10"))
+# Hours between scheduled runs (0 = only run on demand) and how old stored results may be
+REORDER_JOB_INTERVAL_HOURS = float(os.getenv("REORDER_JOB_INTERVAL_HOURS", "6"))
+REORDER_MAX_AGE_HOURS = float(os.getenv("REORDER_MAX_AGE_HOURS", "24"))
+
+# Lease in ``job_leases`` so only one worker process runs the scheduled job
+JOB_LEASE_ID = "reorder_predictions"
+
+LOAD_BATCH_SIZE = 10000
+WRITE_BATCH_SIZE = 1000
+SECONDS_PER_DAY = 86400.0
+
+STATS_PROJECTION = {
+    "_id": 0,
+    "user_id": 1,
+    "product_id": 1,
+    "purchase_count": 1,
+    "total_quantity": 1,
+    "last_purchase_at": 1,
+    "mean_interval_days": 1
+}
+
+
+def score_arrays(
+    purchase_count: np.ndarray,
+    total_quantity: np.ndarray,
+    days_since_last: np.ndarray,
+    mean_interval_days: np.ndarray,
+    horizon_days: float = REORDER_HORIZON_DAYS,
+    prior_interval_days: float = REORDER_PRIOR_INTERVAL_DAYS,
+    prior_weight: float = REORDER_PRIOR_WEIGHT
+):
+    """Repurchase probability and suggested quantity for every (user, product) row at once.
+
+    Inter-purchase times are modelled as exponential with the observed mean
+    interval, so the chance of a purchase by the end of the horizon is
+    1 - exp(-(days since last + horizon) / interval). That is damped for
+    products long overdue (the user likely stopped buying them) and shrunk
+    towards zero for products with few purchases. NaN intervals mean one purchase.
+    """
+    interval = np.where(np.isnan(mean_interval_days), prior_interval_days, mean_interval_days)
+    interval = np.maximum(interval, 1.0)
+
+    due = 1.0 - np.exp(-(days_since_last + horizon_days) / interval)
+    overdue = np.maximum(days_since_last - 2.0 * interval, 0.0)
+    lapse = np.exp(-overdue / interval)
+    confidence = purchase_count / (purchase_count + prior_weight)
+
+    probability = due * lapse * confidence
+    quantity = np.maximum(np.rint(total_quantity / np.maximum(purchase_count, 1)), 1).astype(np.int64)
+    return probability, quantity
+
+
+def top_k_per_user(user_codes: np.ndarray, probability: np.ndarray, k: int, min_probability: float) -> np.ndarray:
+    """Row indices of each user's k most likely products, grouped by user and best first"""
+    order = np.lexsort((-probability, user_codes))
+    sorted_users = user_codes[order]
+
+    # Position of each row within its user's group
+    group_start = np.r_[0, np.flatnonzero(sorted_users[1:] != sorted_users[:-1]) + 1]
+    group_sizes = np.diff(np.r_[group_start, len(order)])
+    rank = np.arange(len(order)) - np.repeat(group_start, group_sizes)
+
+    keep = (rank < k) & (probability[order] >= min_probability)
+    return order[keep]
+
+
+class ReorderPredictor:
+    """Batch job turning purchase aggregates into stored, ranked reorder recommendations.
+
+    Reads ``purchase_stats`` into columnar NumPy arrays, scores every
+    (user, product) pair in one vectorized pass and writes one document per
+    user to ``reorder_recommendations`` with a ``generated_at`` timestamp.
+    """
+
+    def __init__(self):
+        self.status = "idle"
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    async def _load(self, db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+        """Stream the aggregates into columns, coding user ids as integers on the way"""
+        user_index: Dict[str, int] = {}
+        user_codes: List[int] = []
+        product_ids: List[str] = []
+        counts: List[float] = []
+        quantities: List[float] = []
+        last_purchase: List[float] = []
+        intervals: List[float] = []
+
+        cursor = db.purchase_stats.find({}, STATS_PROJECTION).batch_size(LOAD_BATCH_SIZE)
+        async for stat in cursor:
+            last = stat.get("last_purchase_at")
+            if last is None:
+                continue
+            user_codes.append(user_index.setdefault(stat["user_id"], len(user_index)))
+            product_ids.append(stat["product_id"])
+            counts.append(stat.get("purchase_count", 0))
+            quantities.append(stat.get("total_quantity", 0))
+            last_purchase.append(last.timestamp())
+            interval = stat.get("mean_interval_days")
+            intervals.append(np.nan if interval is None else interval)
+
+        return {
+            "users": list(user_index),
+            "user_codes": np.array(user_codes, dtype=np.int64),
+            "product_ids": np.array(product_ids, dtype=object),
+            "purchase_count": np.array(counts, dtype=np.float64),
+            "total_quantity": np.array(quantities, dtype=np.float64),
+            "last_purchase": np.array(last_purchase, dtype=np.float64),
+            "mean_interval_days": np.array(intervals, dtype=np.float64)
+        }
+
+    def predict(self, columns: Dict[str, Any], now: datetime, k: int = REORDER_TOP_K) -> Dict[str, List[Dict[str, Any]]]:
+        """CPU-bound scoring pass; returns ranked recommendations per user id"""
+        users, user_codes = columns["users"], columns["user_codes"]
+        days_since_last = np.maximum((now.timestamp() - columns["last_purchase"]) / SECONDS_PER_DAY, 0.0)
+
+        probability, quantity = score_arrays(
+            columns["purchase_count"],
+            columns["total_quantity"],
+            days_since_last,
+            columns["mean_interval_days"]
+        )
+        selected = top_k_per_user(user_codes, probability, k, REORDER_MIN_PROBABILITY)
+
+        recommendations: Dict[str, List[Dict[str, Any]]] = {user_id: [] for user_id in users}
+        for row in selected:
+            interval = columns["mean_interval_days"][row]
+            recommendations[users[user_codes[row]]].append({
+                "product_id": columns["product_ids"][row],
+                "probability": round(float(probability[row]), 4),
+                "quantity": int(quantity[row]),
+                "days_since_last": round(float(days_since_last[row]), 1),
+                "mean_interval_days": None if np.isnan(interval) else round(float(interval), 1)
+            })
+        return recommendations
+
+    async def run(self, db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+        """Recompute and store recommendations for every user with purchases"""
+        started = time.perf_counter()
+        self.status = "running"
+        try:
+            columns = await self._load(db)
+            loaded = time.perf_counter()
+
+            now = datetime.utcnow()
+            # Keep the event loop free while NumPy works
+            recommendations = await asyncio.get_running_loop().run_in_executor(None, self.predict, columns, now)
+            scored = time.perf_counter()
+
+            operations = []
+            for user_id, items in recommendations.items():
+                operations.append(ReplaceOne(
+                    {"_id": user_id},
+                    {"user_id": user_id, "items": items, "generated_at": now},
+                    upsert=True
+                ))
+                if len(operations) >= WRITE_BATCH_SIZE:
+                    await db.reorder_recommendations.bulk_write(operations, ordered=False)
+                    operations = []
+            if operations:
+                await db.reorder_recommendations.bulk_write(operations, ordered=False)
+
+            self.last_run = {
+                "generated_at": now,
+                "rows": len(columns["user_codes"]),
+                "users": len(recommendations),
+                "load_seconds": round(loaded - started, 3),
+                "score_seconds": round(scored - loaded, 3),
+                "write_seconds": round(time.perf_counter() - scored, 3)
+            }
+            self.status = "ready"
+            print(
+                f"Reorder predictions: {self.last_run['rows']} rows, {self.last_run['users']} users "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+        except Exception as e:
+            self.status = "error"
+            self.last_run = {"generated_at": datetime.utcnow(), "error": str(e)}
+            print(f"Error computing reorder predictions: {e}")
+        return self.last_run
+
+    async def get(self, db: AsyncIOMotorDatabase, user_id: str, max_age_hours: float = REORDER_MAX_AGE_HOURS) -> Optional[Dict[str, Any]]:
+        """Stored recommendations for a user, or None if missing or older than max_age_hours"""
+        stored = await db.reorder_recommendations.find_one({"_id": user_id})
+        if not stored or stored["generated_at"] < datetime.utcnow() - timedelta(hours=max_age_hours):
+            return None
+        return stored
+
+    async def acquire_lease(self, db: AsyncIOMotorDatabase, seconds: float) -> bool:
+        """Take the job lease for ``seconds`` unless another worker holds an unexpired one"""
+        now = datetime.utcnow()
+        try:
+            await db.job_leases.update_one(
+                {"_id": JOB_LEASE_ID, "expires_at": {"$lte": now}},
+                {"$set": {
+                    "owner": f"{socket.gethostname()}:{os.getpid()}",
+                    "acquired_at": now,
+                    "expires_at": now + timedelta(seconds=seconds)
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The lease document exists and has not expired
+            return False
+        return True
+
+    async def run_scheduler(self, db: AsyncIOMotorDatabase, interval_hours: float = REORDER_JOB_INTERVAL_HOURS):
+        """Background loop re-running the job every interval_hours.
+
+        Every worker runs this loop, but the lease lasts a whole interval, so
+        the job runs once per interval across all of them.
+        """
+        if interval_hours <= 0:
+            return
+        while True:
+            try:
+                if await self.acquire_lease(db, interval_hours * 3600):
+                    await self.run(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error scheduling reorder predictions: {e}")
+            await asyncio.sleep(interval_hours * 3600)
+
+
+def benchmark(rows: int = 5_000_000, users: int = 500_000, products: int = 50_000, seed: int = 0) -> Dict[str, float]:
+    """Time the scoring pass on synthetic purchase aggregates (no database needed)"""
+    rng = np.random.default_rng(seed)
+    purchase_count = rng.geometric(0.35, rows).astype(np.float64)
+    columns = {
+        "users": [str(user) for user in range(users)],
+        "user_codes": rng.integers(0, users, rows),
+        "product_ids": rng.integers(0, products, rows).astype(str).astype(object),
+        "purchase_count": purchase_count,
+        "total_quantity": purchase_count * rng.integers(1, 4, rows),
+        "last_purchase": time.time() - rng.uniform(0, 180, rows) * SECONDS_PER_DAY,
+        "mean_interval_days": np.where(purchase_count > 1, rng.uniform(3, 60, rows), np.nan)
+    }
+
+    predictor = ReorderPredictor()
+    started = time.perf_counter()
+    recommendations = predictor.predict(columns, datetime.utcnow())
+    elapsed = time.perf_counter() - started
+
+    # The vectorized part alone, without building the per-user result documents
+    started = time.perf_counter()
+    days = (time.time() - columns["last_purchase"]) / SECONDS_PER_DAY
+    probability, _ = score_arrays(purchase_count, columns["total_quantity"], days, columns["mean_interval_days"])
+    top_k_per_user(columns["user_codes"], probability, REORDER_TOP_K, REORDER_MIN_PROBABILITY)
+    vectorized = time.perf_counter() - started
+
+    return {
+        "rows": rows,
+        "users_with_recommendations": sum(1 for items in recommendations.values() if items),
+        "predict_seconds": round(elapsed, 3),
+        "score_and_rank_seconds": round(vectorized, 3),
+        "rows_per_second": round(rows / elapsed)
+    }
+
+
+# Instantiate global reorder predictor
+reorder_predictor = ReorderPredictor()
+
+
+if __name__ == "__main__":
+    # python -m app.services.reorder_predictor [rows]
+    import sys
+    print(benchmark(rows=int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
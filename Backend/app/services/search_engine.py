@@ -0,0 +1,371 @@
+import re
+import math
+import bisect
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+# Field weights: a term in the product name counts more than one in the description
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "brand": 2.0,
+    "tags": 2.0,
+    "category": 1.5,
+    "root_category_name": 1.0,
+    "description": 1.0,
+}
+
+# Only the fields the index needs are pulled from Mongo
+INDEX_PROJECTION = {field: 1 for field in FIELD_WEIGHTS}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Query terms shorter than this are not expanded to prefixes ("a" would match everything)
+MIN_PREFIX_LENGTH = 2
+
+# Upper bound on vocabulary terms a single prefix may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into alphanumeric tokens"""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class PostingSegment:
+    """Read-only postings in CSR layout, usually memory-mapped from the catalog snapshot.
+
+    The postings of ``terms[i]`` are ``posting_docs[term_offsets[i]:term_offsets[i + 1]]``
+    (indexes into ``doc_ids``) with matching ``posting_freqs``. The arrays are
+    never written, so workers mapping the same file share their pages; only
+    the id and term lookups are per-process.
+    """
+
+    def __init__(
+        self,
+        doc_ids: List[Any],
+        terms: List[str],
+        term_offsets: np.ndarray,
+        posting_docs: np.ndarray,
+        posting_freqs: np.ndarray,
+        doc_lengths: np.ndarray
+    ):
+        if term_offsets.dtype.kind != "i" or posting_docs.dtype.kind != "i":
+            raise ValueError("Posting segment offsets and documents must be integers")
+        if len(term_offsets) != len(terms) + 1 or len(doc_lengths) != len(doc_ids):
+            raise ValueError("Posting segment tables do not line up")
+        if len(posting_docs) != len(posting_freqs) or int(term_offsets[0]) != 0 or int(term_offsets[-1]) != len(posting_docs):
+            raise ValueError("Posting segment offsets do not cover the postings")
+        if len(term_offsets) > 1 and np.any(np.diff(term_offsets) < 0):
+            raise ValueError("Posting segment offsets are not sorted")
+        if len(posting_docs) and (int(posting_docs.min()) < 0 or int(posting_docs.max()) >= len(doc_ids)):
+            raise ValueError("Posting segment refers to unknown documents")
+
+        self.doc_ids = doc_ids
+        self.terms = terms
+        self.term_offsets = term_offsets
+        self.posting_docs = posting_docs
+        self.posting_freqs = posting_freqs
+        self.doc_lengths = doc_lengths
+        self.doc_index = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        self.term_index = {term: i for i, term in enumerate(terms)}
+
+    def posting(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        i = self.term_index.get(term)
+        if i is None:
+            return None
+        start, end = int(self.term_offsets[i]), int(self.term_offsets[i + 1])
+        return self.posting_docs[start:end], self.posting_freqs[start:end]
+
+
+class SearchEngine:
+    """In-memory inverted index over the product catalog with BM25 ranking.
+
+    The index may start from a read-only ``PostingSegment``; products written
+    afterwards go to dict postings layered over it, and a per-process mask
+    hides segment documents that were removed or replaced.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.clear()
+
+    @property
+    def document_count(self) -> int:
+        return len(self.doc_terms) + self._segment_live_count
+
+    @property
+    def average_length(self) -> float:
+        return self.total_length / self.document_count if self.document_count else 0.0
+
+    def _analyze(self, product: Dict[str, Any]) -> Dict[str, float]:
+        """Turn a product document into weighted term frequencies"""
+        frequencies: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            value = product.get(field)
+            if not value:
+                continue
+            if isinstance(value, list):
+                value = " ".join(str(v) for v in value if v)
+            for token in tokenize(str(value)):
+                frequencies[token] += weight
+        return frequencies
+
+    async def build(self, db: AsyncIOMotorDatabase, segment: Optional[PostingSegment] = None):
+        """Tokenize the whole catalog and replace the current index.
+
+        ``segment`` (e.g. from the catalog snapshot) is used as-is, skipping
+        both the collection scan and tokenization.
+        """
+        self.clear()
+        if segment is not None:
+            self.load_segment(segment)
+        else:
+            cursor = db.products.find({"deleted": {"$ne": True}}, INDEX_PROJECTION)
+            async for product in cursor:
+                self.upsert(product)
+        self.ready = True
+        print(f"Search index built with {self.document_count} products and {len(self._sorted_vocabulary())} terms")
+
+    def clear(self):
+        # term -> {doc_id: weighted term frequency}, for products written since the segment
+        self.postings: Dict[str, Dict[Any, float]] = defaultdict(dict)
+        # doc_id -> {term: weighted term frequency}, kept so documents can be removed
+        self.doc_terms: Dict[Any, Dict[str, float]] = {}
+        self.doc_lengths: Dict[Any, float] = {}
+        self.total_length = 0.0
+        self._segment: Optional[PostingSegment] = None
+        self._segment_live: Optional[np.ndarray] = None
+        self._segment_live_count = 0
+        # Sorted vocabulary for prefix expansion, rebuilt lazily after writes
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self.ready = False
+
+    def load_segment(self, segment: PostingSegment):
+        """Replace the index with a prebuilt segment"""
+        self.clear()
+        self._segment = segment
+        self._segment_live = segment.doc_lengths > 0
+        self._segment_live_count = int(self._segment_live.sum())
+        self.total_length = float(segment.doc_lengths[self._segment_live].sum(dtype=np.float64))
+        self._vocabulary_dirty = True
+
+    def export_segment(self) -> Dict[str, Any]:
+        """The current index (segment and later writes merged) as CSR arrays for ``PostingSegment``"""
+        terms = self._sorted_vocabulary()
+        term_positions = {term: i for i, term in enumerate(terms)}
+        doc_ids: List[Any] = []
+        term_parts, doc_parts, freq_parts, length_parts = [], [], [], []
+
+        segment = self._segment
+        if segment is not None:
+            live = np.flatnonzero(self._segment_live)
+            renumbered = np.full(len(segment.doc_ids), -1, dtype=np.int64)
+            renumbered[live] = np.arange(len(live))
+            doc_ids.extend(segment.doc_ids[i] for i in live.tolist())
+            length_parts.append(segment.doc_lengths[live].astype(np.float32))
+
+            term_map = np.array([term_positions[term] for term in segment.terms], dtype=np.int64)
+            posting_terms = np.repeat(term_map, np.diff(segment.term_offsets))
+            posting_docs = renumbered[segment.posting_docs]
+            keep = posting_docs >= 0
+            term_parts.append(posting_terms[keep])
+            doc_parts.append(posting_docs[keep])
+            freq_parts.append(segment.posting_freqs[keep].astype(np.float32))
+
+        first = len(doc_ids)
+        added = list(self.doc_terms)
+        doc_ids.extend(added)
+        length_parts.append(np.array([self.doc_lengths[doc_id] for doc_id in added], dtype=np.float32))
+        added_terms, added_docs, added_freqs = [], [], []
+        for n, doc_id in enumerate(added):
+            for term, frequency in self.doc_terms[doc_id].items():
+                added_terms.append(term_positions[term])
+                added_docs.append(first + n)
+                added_freqs.append(frequency)
+        term_parts.append(np.array(added_terms, dtype=np.int64))
+        doc_parts.append(np.array(added_docs, dtype=np.int64))
+        freq_parts.append(np.array(added_freqs, dtype=np.float32))
+
+        posting_terms = np.concatenate(term_parts)
+        posting_docs = np.concatenate(doc_parts)
+        posting_freqs = np.concatenate(freq_parts)
+
+        # Drop terms left without postings and renumber the rest
+        counts = np.bincount(posting_terms, minlength=len(terms))
+        used = counts > 0
+        posting_terms = (np.cumsum(used) - 1)[posting_terms]
+        terms = [term for term, keep in zip(terms, used.tolist()) if keep]
+
+        order = np.lexsort((posting_docs, posting_terms))
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(counts[used], out=term_offsets[1:])
+        return {
+            "doc_ids": doc_ids,
+            "terms": terms,
+            "term_offsets": term_offsets,
+            "posting_docs": posting_docs[order].astype(np.int32),
+            "posting_freqs": posting_freqs[order],
+            "doc_lengths": np.concatenate(length_parts)
+        }
+
+    def upsert(self, product: Dict[str, Any]):
+        """Add a product to the index, replacing any previous version of it"""
+        doc_id = product["_id"]
+        self.remove(doc_id)
+
+        frequencies = self._analyze(product)
+        if not frequencies:
+            return
+
+        for term, frequency in frequencies.items():
+            if term not in self.postings:
+                self._vocabulary_dirty = True
+            self.postings[term][doc_id] = frequency
+
+        length = sum(frequencies.values())
+        self.doc_terms[doc_id] = dict(frequencies)
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def upsert_many(self, products: Iterable[Dict[str, Any]]):
+        for product in products:
+            self.upsert(product)
+
+    def remove(self, doc_id: Any):
+        """Drop a product from the index if present"""
+        if self._segment is not None:
+            i = self._segment.doc_index.get(doc_id)
+            if i is not None and self._segment_live[i]:
+                self._segment_live[i] = False
+                self._segment_live_count -= 1
+                self.total_length -= float(self._segment.doc_lengths[i])
+
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[term]
+                self._vocabulary_dirty = True
+
+        self.total_length -= self.doc_lengths.pop(doc_id, 0.0)
+
+    def _sorted_vocabulary(self) -> List[str]:
+        if self._vocabulary_dirty or not self._vocabulary:
+            vocabulary = set(self.postings)
+            if self._segment is not None:
+                vocabulary.update(self._segment.terms)
+            self._vocabulary = sorted(vocabulary)
+            self._vocabulary_dirty = False
+        return self._vocabulary
+
+    def _expand(self, term: str) -> List[str]:
+        """Return the vocabulary terms a query term should match"""
+        if len(term) < MIN_PREFIX_LENGTH:
+            known = term in self.postings or (self._segment is not None and term in self._segment.term_index)
+            return [term] if known else []
+
+        vocabulary = self._sorted_vocabulary()
+        matches = []
+        start = bisect.bisect_left(vocabulary, term)
+        for candidate in vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not candidate.startswith(term):
+                break
+            matches.append(candidate)
+        return matches
+
+    def _segment_posting(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Live segment postings for a term"""
+        if self._segment is None:
+            return None
+        posting = self._segment.posting(term)
+        if posting is None:
+            return None
+        docs, frequencies = posting
+        live = self._segment_live[docs]
+        return docs[live], frequencies[live]
+
+    def _idf(self, term: str, segment_posting: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> float:
+        document_frequency = len(self.postings.get(term, ()))
+        if segment_posting is not None:
+            document_frequency += len(segment_posting[0])
+        return math.log(1 + (self.document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def score(self, query: str) -> Dict[Any, float]:
+        """Compute BM25 scores for every document matching the query"""
+        scores: Dict[Any, float] = defaultdict(float)
+        segment_scores: Optional[np.ndarray] = None
+        average_length = self.average_length or 1.0
+
+        for query_term in set(tokenize(query)):
+            # Prefix expansions score lower than an exact hit on the same term
+            for term in self._expand(query_term):
+                boost = 1.0 if term == query_term else 0.5
+                segment_posting = self._segment_posting(term)
+                idf = self._idf(term, segment_posting)
+                for doc_id, frequency in self.postings.get(term, {}).items():
+                    length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / average_length
+                    scores[doc_id] += boost * idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+
+                if segment_posting is not None and len(segment_posting[0]):
+                    docs, frequencies = segment_posting
+                    frequencies = frequencies.astype(np.float64)
+                    length_norm = 1 - self.b + self.b * self._segment.doc_lengths[docs] / average_length
+                    if segment_scores is None:
+                        segment_scores = np.zeros(len(self._segment.doc_ids))
+                    # Postings of one term never repeat a document, so plain fancy-index adds are safe
+                    segment_scores[docs] += boost * idf * frequencies * (self.k1 + 1) / (frequencies + self.k1 * length_norm)
+
+        if segment_scores is not None:
+            hits = np.flatnonzero(segment_scores)
+            for i, value in zip(hits.tolist(), segment_scores[hits].tolist()):
+                scores[self._segment.doc_ids[i]] += value
+
+        return scores
+
+    def search(
+        self,
+        query: str,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        candidates: Optional[Iterable[Any]] = None,
+        scores: Optional[Dict[Any, float]] = None,
+        after: Optional[Tuple[float, Any]] = None
+    ) -> Tuple[List[Tuple[Any, float]], int]:
+        """Return a page of (doc_id, score) pairs ranked by relevance, plus the total hit count.
+
+        When ``candidates`` is given, only those document ids are considered.
+        ``scores`` reuses the result of an earlier ``score(query)`` call, and
+        ``after`` (a (score, doc_id) pair from a previous page) starts the page
+        just past that hit instead of at ``offset``.
+        """
+        if scores is None:
+            scores = self.score(query)
+        if candidates is not None:
+            allowed = set(candidates)
+            scores = {doc_id: s for doc_id, s in scores.items() if doc_id in allowed}
+
+        # Ties are broken on the id so pages are stable between requests
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+        total = len(ranked)
+        if after is not None:
+            after_score, after_id = after
+            position = (-after_score, str(after_id))
+            offset = bisect.bisect_right([(-s, str(doc_id)) for doc_id, s in ranked], position)
+        end = offset + limit if limit else None
+        return ranked[offset:end], total
+
+
+# Instantiate global search engine
+search_engine = SearchEngine()
@@ -0,0 +1,137 @@
+import os
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from app.models.models import ProductResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional, fall back to the stdlib encoder
+    orjson = None
+
+# Response field -> product document fields it is built from
+RESPONSE_SOURCE_FIELDS = {
+    "product_id": ["_id"],
+    "image_url": ["main_image"],
+    "category": ["category", "root_category_name"],
+    "in_stock": ["stock_quantity"],
+}
+
+PRODUCT_FIELDS = list(ProductResponse.model_fields)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a ``fields=name,price`` query value into response field names.
+
+    Returns None when every field was requested. Unknown names are a 400.
+    """
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in ProductResponse.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # product_id is always returned so clients can link to the item
+    if "product_id" not in requested:
+        requested.insert(0, "product_id")
+    return requested
+
+
+def mongo_projection(fields: Optional[List[str]], *extra: str) -> Optional[Dict[str, int]]:
+    """Mongo projection covering the response fields (plus any extra document fields, e.g. the sort key)"""
+    if fields is None:
+        return None
+    projection: Dict[str, int] = {}
+    for field in fields:
+        for source in RESPONSE_SOURCE_FIELDS.get(field, [field]):
+            projection[source] = 1
+    for field in extra:
+        projection[field] = 1
+    return projection
+
+
+def project(mapped: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Keep only the requested response fields"""
+    if fields is None:
+        return mapped
+    return {field: mapped[field] for field in fields}
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode to JSON bytes with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered straight to bytes, skipping response_model validation.
+
+    Only use for content built from trusted database documents.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# Streaming responses for unbounded listings
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "200"))
+
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json-stream": "application/json",
+}
+
+
+def parse_stream_format(format: Optional[str]) -> Optional[str]:
+    """Validate a ``format=`` query value. None means a regular buffered response."""
+    if not format or format == "json":
+        return None
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Must be one of: json, {', '.join(STREAM_FORMATS)}")
+    return format
+
+
+async def _encode_stream(documents: AsyncIterator[Dict[str, Any]], mapper: Callable, format: str):
+    """Encode mapped documents, flushing one chunk per STREAM_BATCH_SIZE rows"""
+    ndjson = format == "ndjson"
+    buffer: List[bytes] = [] if ndjson else [b'{"products":[']
+    count = 0
+
+    async for document in documents:
+        encoded = dumps(mapper(document))
+        if ndjson:
+            buffer.append(encoded + b"\n")
+        else:
+            buffer.append(encoded if count == 0 else b"," + encoded)
+        count += 1
+        if count % STREAM_BATCH_SIZE == 0:
+            yield b"".join(buffer)
+            buffer = []
+
+    if not ndjson:
+        buffer.append(b'],"count":' + str(count).encode("ascii") + b"}")
+    if buffer:
+        yield b"".join(buffer)
+
+
+def stream_response(documents: AsyncIterator[Dict[str, Any]], mapper: Callable, format: str) -> StreamingResponse:
+    """Stream documents as NDJSON (one product per line) or as a chunked JSON array.
+
+    ``documents`` is usually a Motor cursor, so rows are sent as they arrive
+    instead of being collected into a list first.
+    """
+    return StreamingResponse(_encode_stream(documents, mapper, format), media_type=STREAM_FORMATS[format])
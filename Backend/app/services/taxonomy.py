@@ -0,0 +1,69 @@
+import re
+from typing import Any, Dict, List, Optional
+from pymongo import UpdateOne
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+SLUG_PATTERN = re.compile(r"[^a-z0-9]+")
+
+# Products updated per bulk_write during backfill
+BACKFILL_BATCH_SIZE = 1000
+
+
+def slugify(name: Optional[str]) -> str:
+    """Case-folded, punctuation-free key for a category name ("Home & Kitchen" -> "home-kitchen")"""
+    if not name:
+        return ""
+    return SLUG_PATTERN.sub("-", name.casefold()).strip("-")
+
+
+def category_fields(category: Optional[str], root_category_name: Optional[str]) -> Dict[str, Any]:
+    """Taxonomy fields stored on each product document.
+
+    ``category_path`` lists the root slug followed by the leaf slug, so an exact
+    match on it selects a category together with all of its descendants.
+    """
+    root_slug = slugify(root_category_name)
+    category_slug = slugify(category)
+
+    path: List[str] = []
+    for slug in (root_slug, category_slug):
+        if slug and slug not in path:
+            path.append(slug)
+
+    return {
+        "category_slug": category_slug or root_slug,
+        "root_category_slug": root_slug,
+        "category_path": path,
+    }
+
+
+def category_filter(category: str) -> Dict[str, Any]:
+    """Indexed exact-match filter replacing the old case-insensitive $regex on category names"""
+    return {"category_path": slugify(category)}
+
+
+async def backfill(db: AsyncIOMotorDatabase) -> int:
+    """Add taxonomy fields to products stored before they existed"""
+    cursor = db.products.find(
+        {"category_path": {"$exists": False}},
+        {"category": 1, "root_category_name": 1}
+    )
+
+    updated = 0
+    operations = []
+    async for product in cursor:
+        fields = category_fields(product.get("category"), product.get("root_category_name"))
+        operations.append(UpdateOne({"_id": product["_id"]}, {"$set": fields}))
+        if len(operations) >= BACKFILL_BATCH_SIZE:
+            result = await db.products.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            operations = []
+
+    if operations:
+        result = await db.products.bulk_write(operations, ordered=False)
+        updated += result.modified_count
+
+    if updated:
+        print(f"Backfilled category taxonomy on {updated} products")
+    return updated
+
@@ -0,0 +1,62 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Principal cache configuration
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# Fields get_current_user needs; chat and purchase history arrays are never loaded
+IDENTITY_PROJECTION = {"name": 1, "username": 1, "email": 1, "phone": 1, "created_at": 1}
+
+
+class UserCache:
+    """Short-lived cache of authenticated users keyed by token subject (email)"""
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # email -> (expires_at, user)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, subject: str) -> Optional[Any]:
+        entry = self._entries.get(subject)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[subject]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(subject)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, subject: str, user: Any):
+        self._entries[subject] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(subject)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str):
+        """Drop a user after logout or a profile change"""
+        self._entries.pop(subject, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+# Instantiate global user cache
+user_cache = UserCache()
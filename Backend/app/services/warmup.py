@@ -0,0 +1,87 @@
+import time
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Dict, Iterable, List, Optional
+
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+
+class Warmup:
+    """Tracks startup phases so slow initialization can run in the background"""
+
+    def __init__(self):
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.tasks: List[asyncio.Task] = []
+
+    def register(self, names: Iterable[str]):
+        """Declare phases up front so they report as pending before they start"""
+        for name in names:
+            self.phases.setdefault(name, {"state": PENDING})
+
+    def state(self, name: str) -> Optional[str]:
+        phase = self.phases.get(name)
+        return phase["state"] if phase else None
+
+    def is_ready(self, name: str) -> bool:
+        return self.state(name) == READY
+
+    def is_warming(self, name: str) -> bool:
+        return self.state(name) in (PENDING, RUNNING)
+
+    async def run(self, name: str, awaitable: Awaitable, critical: bool = False) -> bool:
+        """Await one phase, recording state and timing.
+
+        Failures of non-critical phases are recorded and swallowed so the
+        remaining phases still run; critical failures are re-raised.
+        """
+        phase = self.phases.setdefault(name, {})
+        phase.update({"state": RUNNING, "started_at": datetime.utcnow(), "error": None})
+        started = time.perf_counter()
+        try:
+            await awaitable
+            phase["state"] = READY
+            return True
+        except Exception as e:
+            phase["state"] = FAILED
+            phase["error"] = str(e)
+            print(f"Warning: startup phase '{name}' failed: {e}")
+            if critical:
+                raise
+            return False
+        finally:
+            phase["duration_seconds"] = round(time.perf_counter() - started, 3)
+            print(f"Startup phase '{name}' {phase['state']} in {phase['duration_seconds']}s")
+
+    def fail(self, names: Iterable[str], reason: str):
+        """Mark phases that will not run, e.g. because a phase they depend on failed"""
+        for name in names:
+            self.phases.setdefault(name, {}).update({"state": FAILED, "error": reason})
+            print(f"Warning: startup phase '{name}' skipped: {reason}")
+
+    def background(self, awaitable: Awaitable) -> asyncio.Task:
+        """Schedule warmup work without blocking startup"""
+        task = asyncio.create_task(awaitable)
+        self.tasks.append(task)
+        return task
+
+    async def shutdown(self):
+        for task in self.tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def report(self, required: Iterable[str]) -> Dict[str, Any]:
+        required = list(required)
+        return {
+            "ready": all(self.is_ready(name) for name in required),
+            "required": required,
+            "phases": self.phases
+        }
+
+
+# Instantiate global warmup tracker
+warmup = Warmup()
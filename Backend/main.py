@@ -1,37 +1,98 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
 from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import os
 from dotenv import load_dotenv
 
-from app.routers import auth, products, cart, purchases, chatbot
+from app.routers import auth, products, cart, purchases, chatbot, admin
 from app.services.database import connect_to_mongo, close_mongo_connection, get_database
 from app.services.data_loader import data_loader
 from app.services.chatbot import chatbot_service
+from app.services.search_engine import search_engine
+from app.services.facet_index import facet_index
+from app.services import taxonomy
+from app.services.index_manager import index_manager
+from app.services.warmup import warmup
+from app.services.catalog_snapshot import catalog_snapshot
+from app.services.chat_store import chat_store
+from app.services.cart_store import cart_store
+from app.services.inventory import inventory_manager
+from app.services.order_history import order_history
+from app.services.purchase_stats import purchase_stats
+from app.services.reorder_predictor import reorder_predictor
 
 # Load environment variables
 load_dotenv()
 
+# Phases that must finish before /ready reports the instance as ready
+READY_PHASES = ["mongo", "catalog"]
+
+async def warm_catalog(db):
+    """Background warmup: load the catalog, then build everything derived from it"""
+    async def load_catalog():
+        await data_loader.load_products_from_csv(db)
+        await taxonomy.backfill(db)
+    
+    if not await warmup.run("catalog", load_catalog()):
+        # Nothing below runs, so do not leave these reporting "pending" forever
+        warmup.fail(["search_index", "facet_index", "chatbot"], "catalog phase failed")
+        return
+    
+    # Warm start from the snapshot when it matches the current catalog version
+    version = await data_loader.get_catalog_version(db)
+    snapshot = await asyncio.get_running_loop().run_in_executor(None, catalog_snapshot.read, version)
+    
+    # Independent consumers of the catalog warm up concurrently
+    await asyncio.gather(
+        warmup.run("search_index", search_engine.build(db, snapshot and snapshot["search"])),
+        warmup.run("facet_index", facet_index.build(db, snapshot and snapshot["facets"])),
+        warmup.run("chatbot", chatbot_service.initialize_rag_system(db))
+    )
+    
+    if snapshot is None:
+        try:
+            await catalog_snapshot.export(version)
+        except Exception as e:
+            print(f"Warning: failed to write catalog snapshot: {e}")
+
+async def reconcile_indexes(db):
+    """Background warmup: reconcile indexes, failing the phase when the reconcile reports an error"""
+    report = await index_manager.reconcile(db)
+    if index_manager.status == "error":
+        # reconcile() records errors instead of raising so the admin routes can show them
+        raise RuntimeError(report.get("error") or f"{len(report['failed'])} index builds failed")
+
+async def schedule_reorder_predictions(db):
+    """Start the reorder job once the purchase aggregates it reads are backfilled"""
+    while warmup.is_warming("purchase_stats"):
+        await asyncio.sleep(1)
+    await reorder_predictor.run_scheduler(db)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    await connect_to_mongo()
-    
-    # Load initial data
+    # Startup - only the database connection is on the critical path
+    warmup.register(["mongo", "indexes", "catalog", "search_index", "facet_index", "chatbot", "chat_migration", "cart_migration", "order_counts", "purchase_stats"])
+    await warmup.run("mongo", connect_to_mongo(), critical=True)
     db = await get_database()
-    await data_loader.create_indexes(db)
-    await data_loader.load_products_from_csv(db)
     
-    # Initialize chatbot RAG system
-    try:
-        await chatbot_service.initialize_rag_system(db)
-        print("Chatbot RAG system initialized successfully")
-    except Exception as e:
-        print(f"Warning: Failed to initialize chatbot RAG system: {e}")
+    # Everything else warms up in the background; routes degrade until it is ready
+    warmup.background(warmup.run("indexes", reconcile_indexes(db)))
+    warmup.background(warm_catalog(db))
+    warmup.background(warmup.run("chat_migration", chat_store.migrate_embedded_history(db)))
+    warmup.background(warmup.run("cart_migration", cart_store.migrate_line_documents(db)))
+    warmup.background(warmup.run("order_counts", order_history.backfill_counts(db)))
+    warmup.background(warmup.run("purchase_stats", purchase_stats.backfill(db)))
+    warmup.background(inventory_manager.run_sweeper(db))
+    warmup.background(data_loader.watch_catalog_version(db))
+    warmup.background(schedule_reorder_predictions(db))
     
     yield
     # Shutdown
+    await warmup.shutdown()
     await close_mongo_connection()
 
 # Create FastAPI app
@@ -49,6 +110,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paginated routes return their cursor and total in headers
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
 # Include routers
@@ -57,6 +120,7 @@ app.include_router(products.router, prefix="/api/items", tags=["Products"])
 app.include_router(cart.router, prefix="/api/user", tags=["Cart"])
 app.include_router(purchases.router, prefix="/api/user", tags=["Purchases"])
 app.include_router(chatbot.router, prefix="/api/chatbot", tags=["Chatbot"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 
 @app.get("/")
 async def root():
@@ -70,6 +134,15 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the required startup phases are done"""
+    report = warmup.report(READY_PHASES)
+    return JSONResponse(
+        status_code=200 if report["ready"] else 503,
+        content=jsonable_encoder(report)
+    )
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
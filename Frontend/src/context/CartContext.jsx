@@ -4,6 +4,9 @@ import api from '../services/api'
 
 const CartContext = createContext()
 
+// Most operations POST /cart/batch accepts per request
+const CART_BATCH_LIMIT = 100
+
 export const useCart = () => {
     const context = useContext(CartContext)
     if (!context) {
@@ -63,6 +66,34 @@ export const CartProvider = ({ children }) => {
         }
     }
 
+    const addItems = async (items) => {
+        if (!user) return { success: false, error: 'Please login first' }
+
+        try {
+            const operations = items.map(item => ({
+                op: 'add',
+                product_id: item.product_id,
+                quantity: item.quantity
+            }))
+            // One POST /cart/batch per chunk instead of one request per item; each answers with the updated cart
+            let response = null
+            for (let start = 0; start < operations.length; start += CART_BATCH_LIMIT) {
+                response = await api.cart.batch(operations.slice(start, start + CART_BATCH_LIMIT))
+            }
+            if (response) {
+                setCart(response.data || { items: {} })
+            }
+            return { success: true }
+        } catch (error) {
+            console.error('Add items to cart error:', error.response?.data || error.message)
+            await fetchCart() // Earlier chunks may already have been applied
+            return {
+                success: false,
+                error: error.response?.data?.detail || error.message || 'Failed to add items to cart'
+            }
+        }
+    }
+
     const updateQuantity = async (productId, quantity) => {
         if (!user) return { success: false, error: 'Please login first' }
 
@@ -124,6 +155,7 @@ export const CartProvider = ({ children }) => {
         cart,
         loading,
         addToCart,
+        addItems,
         updateQuantity,
         removeFromCart,
         clearCart,
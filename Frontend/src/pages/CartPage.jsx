@@ -8,6 +8,7 @@ import api from '../services/api'
 
 const CartPage = () => {
     const [products, setProducts] = useState({})
+    const [serverSubtotal, setServerSubtotal] = useState(0)
     const [loading, setLoading] = useState(true)
     const [updatingItems, setUpdatingItems] = useState({})
     const [orderLoading, setOrderLoading] = useState(false)
@@ -27,21 +28,13 @@ const CartPage = () => {
     const fetchCartProducts = async () => {
         try {
             setLoading(true)
-            const productPromises = Object.keys(cart.items).map(async (productId) => {
-                try {
-                    const response = await api.products.getById(productId)
-                    return { [productId]: response.data.product }
-                } catch (error) {
-                    console.error(`Error fetching product ${productId}:`, error)
-                    return null
-                }
-            })
-
-            const productResults = await Promise.all(productPromises)
-            const productsData = productResults
-                .filter(result => result !== null)
-                .reduce((acc, product) => ({ ...acc, ...product }), {})
+            // Server-side hydrated cart: product summaries and totals in one request
+            const response = await api.cart.getView()
+            const productsData = response.data.lines
+                .filter(line => line.product !== null)
+                .reduce((acc, line) => ({ ...acc, [line.product_id]: line.product }), {})
             setProducts(productsData)
+            setServerSubtotal(response.data.subtotal)
         } catch (error) {
             console.error('Error fetching cart products:', error)
         } finally {
@@ -50,13 +43,7 @@ const CartPage = () => {
     }
 
     const calculateSubtotal = () => {
-        return Object.entries(cart.items).reduce((total, [productId, quantity]) => {
-            const product = products[productId]
-            if (product) {
-                return total + (product.price * quantity)
-            }
-            return total
-        }, 0)
+        return serverSubtotal
     }
 
     const calculateTax = (subtotal) => {
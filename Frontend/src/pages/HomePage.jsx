@@ -124,12 +124,12 @@ const HomePage = () => {
         { name: 'Beauty', icon: '💄' },
         { name: 'Home', icon: '🏠' },
         { name: 'Food', icon: '🛒' },
-        { name: 'Health', icon: '💊' },
+        { name: 'Health and Medicine', icon: '💊' },
         { name: 'Arts & Crafts', icon: '🎨' },
         { name: 'Pets', icon: '🐕' },
         { name: 'Baby', icon: '👶' },
         { name: 'Toys', icon: '🎮' },
-        { name: 'Sports', icon: '⚽' },
+        { name: 'Sports & Outdoors', icon: '⚽' },
         { name: 'Books', icon: '📚' }
     ]
 
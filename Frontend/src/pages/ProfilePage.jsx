@@ -44,7 +44,7 @@ const ProfilePage = () => {
             }, 0)
             
             setStats({
-                totalOrders: purchases.length,
+                totalOrders: purchasesResponse.data?.total_orders ?? purchases.length,
                 totalSpent: totalSpent,
                 itemsInCart: getCartItemCount()
             })
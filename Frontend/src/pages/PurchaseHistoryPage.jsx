@@ -3,15 +3,21 @@ import { Link, useLocation } from 'react-router-dom'
 import { ChevronDown, ChevronUp, Calendar, Package, CheckCircle } from 'lucide-react'
 import Navbar from '../components/Navbar'
 import { useAuth } from '../context/AuthContext'
+import { useCart } from '../context/CartContext'
 import api from '../services/api'
 
+// Most ids POST /items/batch accepts per request
+const PRODUCT_BATCH_LIMIT = 500
+
 const PurchaseHistoryPage = () => {
     const [purchases, setPurchases] = useState([])
     const [loading, setLoading] = useState(true)
     const [expandedPurchase, setExpandedPurchase] = useState(null)
     const [products, setProducts] = useState({})
+    const [reordering, setReordering] = useState(null)
 
     const { user } = useAuth()
+    const { addItems } = useCart()
     const location = useLocation()
 
     useEffect(() => {
@@ -54,26 +60,39 @@ const PurchaseHistoryPage = () => {
 
     const fetchProductDetails = async (productIds) => {
         try {
-            const productPromises = productIds.map(async (productId) => {
-                try {
-                    const response = await api.products.getById(productId)
-                    return { [productId]: response.data.product }
-                } catch (error) {
-                    console.error(`Error fetching product ${productId}:`, error)
-                    return null
-                }
-            })
+            if (productIds.length === 0) {
+                setProducts({})
+                return
+            }
 
-            const productResults = await Promise.all(productPromises)
-            const productsData = productResults
-                .filter(result => result !== null)
-                .reduce((acc, product) => ({ ...acc, ...product }), {})
+            // Batch requests instead of one request per product; the endpoint takes at most 500 ids
+            const chunks = []
+            for (let start = 0; start < productIds.length; start += PRODUCT_BATCH_LIMIT) {
+                chunks.push(productIds.slice(start, start + PRODUCT_BATCH_LIMIT))
+            }
+            const responses = await Promise.all(chunks.map(chunk => api.products.getBatch(chunk)))
+            const productsData = responses
+                .flatMap(response => response.data.results)
+                .filter(result => result.product !== null)
+                .reduce((acc, result) => ({ ...acc, [result.requested_id]: result.product }), {})
             setProducts(productsData)
         } catch (error) {
             console.error('Error fetching product details:', error)
         }
     }
 
+    const handleReorder = async (order) => {
+        setReordering(order.order_id)
+        const result = await addItems(order.items)
+        setReordering(null)
+
+        if (result.success) {
+            alert(`Added ${order.items.length} item(s) from this order to your cart`)
+        } else {
+            alert(result.error)
+        }
+    }
+
     const formatDate = (dateString) => {
         const date = new Date(dateString)
         return date.toLocaleDateString('en-US', {
@@ -262,8 +281,12 @@ const PurchaseHistoryPage = () => {
                                             <span className="text-gray-800 capitalize">{order.payment_method}</span>
                                         </div>
                                         <div className="flex justify-between items-center">
-                                            <button className="text-blue-600 hover:text-blue-800 font-medium">
-                                                Reorder Items
+                                            <button
+                                                onClick={() => handleReorder(order)}
+                                                disabled={reordering === order.order_id}
+                                                className="text-blue-600 hover:text-blue-800 font-medium disabled:opacity-50"
+                                            >
+                                                {reordering === order.order_id ? 'Adding to Cart...' : 'Reorder Items'}
                                             </button>
                                             <div className="text-right">
                                                 <p className="text-lg font-semibold text-gray-800">
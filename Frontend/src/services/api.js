@@ -39,6 +39,7 @@ export const api = {
     products: {
         getAll: (params = {}) => axios.get('/items', { params }),
         getById: (id) => axios.get(`/items/${id}`),
+        getBatch: (ids) => axios.post('/items/batch', { product_ids: ids }),
         search: (query) => axios.get(`/items/search/${encodeURIComponent(query)}`),
         getCategories: () => axios.get('/items/categories/list'),
         getByCategory: (category) => axios.get(`/items/category/${encodeURIComponent(category)}`)
@@ -47,9 +48,11 @@ export const api = {
     // Cart endpoints
     cart: {
         get: () => axios.get('/user/cart'),
+        getView: () => axios.get('/user/cart/view'),
         add: (itemData) => axios.post('/user/cart/add', itemData),
         update: (itemData) => axios.put('/user/cart/update', itemData),
         remove: (productId) => axios.delete(`/user/cart/remove/${productId}`),
+        batch: (operations) => axios.post('/user/cart/batch', { operations }),
         clear: () => axios.delete('/user/cart/clear'),
         getCount: () => axios.get('/user/cart/count'),
         placeOrder: (orderData) => axios.post('/user/cart/place-order', orderData)
@@ -59,6 +62,7 @@ export const api = {
     purchases: {
         getHistory: (params = {}) => axios.get('/user/purchases', { params }),
         create: (purchaseData) => axios.post('/user/purchases', purchaseData),
+        getStats: (params = {}) => axios.get('/user/purchases/stats', { params }),
         getById: (id) => axios.get(`/user/purchases/${id}`),
         reorder: (id) => axios.post(`/user/purchases/${id}/reorder`),
         getOrderHistory: (params = {}) => axios.get('/user/orders/history', { params })